@@ -5,6 +5,7 @@ from .forms import RegisterForm
 from .models import Address
 from django.contrib.auth.decorators import login_required
 from store.models import Product
+from cart.guest import GuestCart
 
 def register_view(request):
     if request.method == 'POST':
@@ -36,9 +37,13 @@ def login_view(request):
 
             # Check if user is a seller
             if hasattr(user, 'seller'):
-                return redirect('seller_dashboard')  # Seller dashboard
+                response = redirect('seller_dashboard')  # Seller dashboard
             else:
-                return redirect('home')  # Normal user homepage
+                response = redirect('home')  # Normal user homepage
+
+            # Fold any guest cart into the user's cart
+            GuestCart(request).merge_into(user, response)
+            return response
 
         else:
             messages.error(request, 'Invalid username or password.')
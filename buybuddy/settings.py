@@ -111,6 +111,26 @@ DATABASES = {
 
 
 
+# Cache
+# The product, review, cart, tracking, wishlist and page caches are kept
+# fresh by invalidating on writes, so every process (each gunicorn worker
+# and management commands such as ingest_shipment_events) must share one
+# cache server; Django's default per-process LocMemCache would only see its
+# own invalidations. Redis by default (needs the redis package); memcached
+# works too via CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache.
+# For local development without a cache server, a single runserver process
+# can use CACHE_BACKEND=django.core.cache.backends.locmem.LocMemCache.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': config('CACHE_LOCATION', default='redis://127.0.0.1:6379/1'),
+    }
+}
+
+# Tests run on a LocMemCache (see buybuddy.test_runner), never the shared one
+TEST_RUNNER = 'buybuddy.test_runner.LocalCacheTestRunner'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -160,9 +180,36 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 
+# Product search: store.search.SQLiteFTSBackend, PostgresSearchBackend or SimpleSearchBackend
+SEARCH_BACKEND = config('SEARCH_BACKEND', default='store.search.SQLiteFTSBackend')
+
+
 RAZORPAY_KEY_ID = config('RAZORPAY_KEY_ID', default='')
 RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET', default='')
 
+# Render each invoice in the background as soon as its order commits, so the
+# first download doesn't wait for reportlab. Off, invoices are rendered on
+# first download instead.
+INVOICE_PRERENDER = config('INVOICE_PRERENDER', default=True, cast=bool)
+
+# Seconds anonymous (session-less) visitors are served cached home, category
+# and search pages; 0 turns the page cache off. Saves to products, images,
+# categories and brands invalidate the affected pages.
+ANONYMOUS_PAGE_CACHE_TIMEOUT = config('ANONYMOUS_PAGE_CACHE_TIMEOUT', default=0, cast=int)
+
+# Shared secret the courier sends as "Authorization: Bearer <token>" when
+# posting shipment events; the endpoint is disabled while it's empty
+COURIER_WEBHOOK_TOKEN = config('COURIER_WEBHOOK_TOKEN', default='')
+
+# Outgoing mail (wishlist alerts). Written to files under sent_emails/ by
+# default; point EMAIL_BACKEND at django.core.mail.backends.smtp.EmailBackend
+# to hand it to a local MTA instead
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.filebased.EmailBackend')
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=os.path.join(BASE_DIR, 'sent_emails'))
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='BuyBuddy <no-reply@buybuddy.local>')
+
 
 
 if not DEBUG:
@@ -0,0 +1,23 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class LocalCacheTestRunner(DiscoverRunner):
+    """Runs the tests against an in-process cache instead of the shared server.
+
+    Tests clear the cache freely, which must never reach the Redis used by
+    the running site (and a test run shouldn't need one at all). Runners
+    that don't go through TEST_RUNNER, such as pytest, should set
+    CACHE_BACKEND=django.core.cache.backends.locmem.LocMemCache instead.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._local_cache = override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        )
+        self._local_cache.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._local_cache.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,22 @@
+from django.core.cache import cache
+
+from .models import CartItem
+
+CART_COUNT_TIMEOUT = 24 * 60 * 60
+
+
+def cart_count_key(user_id):
+    return f'cart:count:{user_id}'
+
+
+def get_cart_count(user):
+    key = cart_count_key(user.id)
+    count = cache.get(key)
+    if count is None:
+        count = CartItem.objects.filter(cart__user=user).count()
+        cache.set(key, count, CART_COUNT_TIMEOUT)
+    return count
+
+
+def invalidate_cart_count(user_id):
+    cache.delete(cart_count_key(user_id))
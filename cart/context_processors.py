@@ -1,11 +1,16 @@
-from .models import Cart, CartItem
+from functools import cache
+
+from .caching import get_cart_count
+from .guest import GuestCart
+
 
 def cart_item_count(request):
-    count = 0
-    if request.user.is_authenticated:
-        try:
-            cart = Cart.objects.get(user=request.user)
-            count = CartItem.objects.filter(cart=cart).count()
-        except Cart.DoesNotExist:
-            count = 0
+    # Templates call callables on lookup, so the count (and any query behind
+    # it) is only resolved on pages that actually render the badge
+    @cache
+    def count():
+        if request.user.is_authenticated:
+            return get_cart_count(request.user)
+        return len(GuestCart(request))
+
     return {'cart_item_count': count}
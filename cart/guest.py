@@ -0,0 +1,102 @@
+import json
+from decimal import Decimal
+
+from django.core import signing
+from django.db import transaction
+
+from store.models import Product
+from .caching import invalidate_cart_count
+from .models import Cart, CartItem
+
+GUEST_CART_COOKIE = 'guest_cart'
+GUEST_CART_SALT = 'cart.guest'
+GUEST_CART_MAX_AGE = 30 * 24 * 60 * 60
+# Keeps the signed cookie comfortably under the 4KB browser limit
+GUEST_CART_MAX_LINES = 50
+
+
+class GuestLine:
+    """Mirrors the CartItem attributes the cart template uses; ``id`` is the product id."""
+
+    def __init__(self, product, quantity):
+        self.id = product.id
+        self.product = product
+        self.quantity = quantity
+        self.subtotal = product.price * quantity
+
+
+class GuestCart:
+    """A cart for anonymous visitors kept in a signed cookie.
+
+    Nothing is written to the database until the visitor logs in, when
+    ``merge_into()`` folds the lines into their Cart in one upsert.
+    """
+
+    def __init__(self, request):
+        try:
+            data = request.get_signed_cookie(
+                GUEST_CART_COOKIE, salt=GUEST_CART_SALT, max_age=GUEST_CART_MAX_AGE
+            )
+            # Signed by us, so the shape can be trusted
+            self.items = {int(product_id): quantity for product_id, quantity in json.loads(data).items()}
+        except (KeyError, signing.BadSignature):
+            self.items = {}
+        self.modified = False
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, product_id, quantity=1):
+        if product_id not in self.items and len(self.items) >= GUEST_CART_MAX_LINES:
+            return False
+        self.items[product_id] = self.items.get(product_id, 0) + quantity
+        self.modified = True
+        return True
+
+    def set(self, product_id, quantity):
+        if product_id not in self.items:
+            return
+        if quantity > 0:
+            self.items[product_id] = quantity
+        else:
+            del self.items[product_id]
+        self.modified = True
+
+    def remove(self, product_id):
+        self.set(product_id, 0)
+
+    def lines(self):
+        products = Product.objects.for_listing().filter(id__in=self.items)
+        lines = [GuestLine(product, self.items[product.id]) for product in products]
+        total = sum((line.subtotal for line in lines), Decimal('0.00'))
+        return lines, total
+
+    def save(self, response):
+        if not self.modified:
+            return
+        if self.items:
+            response.set_signed_cookie(
+                GUEST_CART_COOKIE,
+                json.dumps(self.items, separators=(',', ':')),
+                salt=GUEST_CART_SALT,
+                max_age=GUEST_CART_MAX_AGE,
+                httponly=True,
+                samesite='Lax',
+            )
+        else:
+            response.delete_cookie(GUEST_CART_COOKIE, samesite='Lax')
+
+    def merge_into(self, user, response):
+        """Move the guest lines into the user's cart and clear the cookie."""
+        if not self.items:
+            return
+        # Products may have been deleted since they were added
+        product_ids = Product.objects.filter(id__in=self.items).values_list('id', flat=True)
+        quantities = {product_id: self.items[product_id] for product_id in product_ids}
+        with transaction.atomic():
+            cart, _ = Cart.objects.get_or_create(user=user)
+            CartItem.objects.add_quantities(cart.id, quantities)
+        invalidate_cart_count(user.id)
+        self.items = {}
+        self.modified = True
+        self.save(response)
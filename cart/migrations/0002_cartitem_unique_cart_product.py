@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:21
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    CartItem = apps.get_model('cart', 'CartItem')
+    duplicates = (
+        CartItem.objects.values('cart_id', 'product_id')
+        .annotate(lines=Count('id'), keep=Min('id'), total=Sum('quantity'))
+        .filter(lines__gt=1)
+    )
+    for row in list(duplicates):
+        lines = CartItem.objects.filter(cart_id=row['cart_id'], product_id=row['product_id'])
+        lines.exclude(id=row['keep']).delete()
+        lines.update(quantity=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_cart_product'),
+        ),
+    ]
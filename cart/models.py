@@ -1,6 +1,21 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import connection, models, transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Sum, Value, When, Window
 from django.contrib.auth.models import User
-from store.models import Product
+from django.utils import timezone
+from django.utils.functional import cached_property
+from store.models import Product, featured_image_prefetch
+
+CENTS = Decimal('0.01')
+
+
+def line_subtotal():
+    return ExpressionWrapper(
+        F('quantity') * F('product__price'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
 
 # Cart Model
 class Cart(models.Model):
@@ -11,13 +26,74 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart of {self.user.username}"
 
+    @cached_property
+    def summary(self):
+        return CartSummary(self)
+
     def get_total(self):
-        return sum(item.get_subtotal() for item in self.items.all())
+        total = self.items.aggregate(total=Sum(line_subtotal()))['total']
+        return (total or Decimal('0')).quantize(CENTS)
 
     def get_total_items(self):
         return self.items.count()
 
 
+# Cart Item QuerySet
+class CartItemQuerySet(models.QuerySet):
+
+    def for_summary(self):
+        """Cart lines with ``subtotal`` plus cart-wide ``cart_total`` and
+        ``cart_quantity`` computed by window aggregates in the same query."""
+        return self.select_related('product__category').prefetch_related(
+            featured_image_prefetch('product__images')
+        ).annotate(
+            subtotal=line_subtotal(),
+            cart_total=Window(Sum(line_subtotal()), partition_by=F('cart_id')),
+            cart_quantity=Window(Sum('quantity'), partition_by=F('cart_id')),
+        ).order_by('added_at', 'id')
+
+    def set_quantities(self, user, quantities):
+        """Set ``{item_id: quantity}`` on a user's cart lines in one transaction.
+
+        Lines set to zero or less are deleted; the rest are updated by a
+        single ``UPDATE ... CASE``. Returns the number of lines touched.
+        """
+        items = self.filter(cart__user=user)
+        keep = {item_id: quantity for item_id, quantity in quantities.items() if quantity > 0}
+        drop = [item_id for item_id, quantity in quantities.items() if quantity <= 0]
+        touched = 0
+        with transaction.atomic():
+            if keep:
+                touched += items.filter(id__in=keep).update(quantity=Case(
+                    *[When(id=item_id, then=Value(quantity)) for item_id, quantity in keep.items()],
+                    output_field=models.PositiveIntegerField(),
+                ))
+            if drop:
+                touched += items.filter(id__in=drop).delete()[0]
+        return touched
+
+    def add_quantities(self, cart_id, quantities):
+        """Add ``{product_id: quantity}`` to a cart in one upsert statement.
+
+        Existing lines are incremented in place (``ON CONFLICT DO UPDATE``),
+        so concurrent writers never lose each other's quantities.
+        """
+        if not quantities:
+            return
+        table = self.model._meta.db_table
+        now = timezone.now()
+        rows = ', '.join(['(%s, %s, %s, %s)'] * len(quantities))
+        params = []
+        for product_id, quantity in quantities.items():
+            params += [cart_id, product_id, quantity, now]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (cart_id, product_id, quantity, added_at) VALUES {rows} "
+                f"ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = {table}.quantity + excluded.quantity",
+                params,
+            )
+
+
 # Cart Item Model
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
@@ -25,8 +101,44 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     added_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
 
     def get_subtotal(self):
+        # Use the annotation from for_summary() when present
+        if hasattr(self, 'subtotal'):
+            return self.subtotal
         return self.product.price * self.quantity
+
+
+class CartSummary:
+    """A cart's lines and totals, loaded once per request.
+
+    One query fetches the lines with their products and totals; a second
+    prefetches each product's featured image. Views pass the summary to
+    templates rather than calling ``get_total()`` again.
+    """
+
+    def __init__(self, cart):
+        self.cart = cart
+        self.lines = list(cart.items.for_summary())
+        # SQLite returns computed decimals unscaled; normalize to paise
+        for line in self.lines:
+            line.subtotal = line.subtotal.quantize(CENTS)
+        first = self.lines[0] if self.lines else None
+        self.total = first.cart_total.quantize(CENTS) if first else Decimal('0.00')
+        self.quantity = first.cart_quantity if first else 0
+        self.item_count = len(self.lines)
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
@@ -1,3 +1,233 @@
-from django.test import TestCase
+import json
+import threading
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError, close_old_connections, connection
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from store.models import Category, Product, ProductImage
+from .context_processors import cart_item_count
+from .models import Cart, CartItem
+
+
+class CartCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Books", slug="books")
+        cls.products = [
+            Product.objects.create(category=category, name=f"Book {i}", slug=f"book-{i}", price=100)
+            for i in range(2)
+        ]
+        cls.user = User.objects.create_user("shopper", password="pass12345")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_count_is_lazy_and_cached(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        with self.assertNumQueries(0):
+            context = cart_item_count(request)
+        with self.assertNumQueries(1):
+            self.assertEqual(context["cart_item_count"](), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(cart_item_count(request)["cart_item_count"](), 0)
+
+    def test_cart_mutations_refresh_badge(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("add_to_cart", args=[self.products[0].id]))
+        self.client.get(reverse("add_to_cart", args=[self.products[1].id]))
+        self.assertEqual(self.client.get(reverse("view_cart")).context["cart_item_count"](), 2)
+
+        item = self.user.cart.items.first()
+        self.client.get(reverse("remove_cart_item", args=[item.id]))
+        self.assertEqual(self.client.get(reverse("view_cart")).context["cart_item_count"](), 1)
+
+
+class CartSummaryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Grocery", slug="grocery")
+        cls.user = User.objects.create_user("shopper", password="pass12345")
+        cls.cart = Cart.objects.create(user=cls.user)
+
+    def add_lines(self, count, start=0):
+        for i in range(start, start + count):
+            product = Product.objects.create(
+                category=self.category, name=f"Item {i}", slug=f"item-{i}", price=Decimal("0.10")
+            )
+            ProductImage.objects.create(product=product, image=f"product_images/{i}.jpg", is_featured=True)
+            CartItem.objects.create(cart=self.cart, product=product, quantity=3)
+
+    def test_totals_are_computed_in_the_database(self):
+        self.add_lines(3)
+        cart = Cart.objects.get(pk=self.cart.pk)
+        with self.assertNumQueries(2):
+            summary = cart.summary
+            [line.product.featured_image for line in summary]
+        self.assertEqual(summary.total, Decimal("0.90"))
+        self.assertEqual(summary.quantity, 9)
+        self.assertEqual(summary.item_count, 3)
+        self.assertEqual([line.subtotal for line in summary], [Decimal("0.30")] * 3)
+        self.assertEqual(self.cart.get_total(), Decimal("0.90"))
+
+    def test_view_cart_query_count_is_constant(self):
+        self.client.force_login(self.user)
+
+        def count():
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(reverse("view_cart"))
+            return len(ctx.captured_queries)
+
+        self.add_lines(1)
+        small = count()
+        self.add_lines(10, start=1)
+        self.assertEqual(count(), small)
+
+
+class GuestCartTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Books", slug="books")
+        cls.products = [
+            Product.objects.create(category=category, name=f"Book {i}", slug=f"book-{i}", price=100)
+            for i in range(2)
+        ]
+        cls.user = User.objects.create_user("shopper", password="pass12345")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_guest_add_to_cart_writes_nothing(self):
+        url = reverse("add_to_cart", args=[self.products[0].id])
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+            self.client.get(url)
+        writes = [q for q in ctx.captured_queries if not q["sql"].startswith("SELECT")]
+        self.assertEqual(writes, [])
+
+        response = self.client.get(reverse("view_cart"))
+        self.assertEqual([(line.product, line.quantity) for line in response.context["items"]], [(self.products[0], 2)])
+        self.assertEqual(response.context["total"], Decimal("200.00"))
+        self.assertEqual(response.context["cart_item_count"](), 1)
+
+    def test_guest_update_and_remove(self):
+        self.client.get(reverse("add_to_cart", args=[self.products[0].id]))
+        self.client.get(reverse("add_to_cart", args=[self.products[1].id]))
+        self.client.post(reverse("update_quantity", args=[self.products[0].id]), {"quantity": 5})
+        self.client.get(reverse("remove_cart_item", args=[self.products[1].id]))
+        items = self.client.get(reverse("view_cart")).context["items"]
+        self.assertEqual([(line.product, line.quantity) for line in items], [(self.products[0], 5)])
+
+    def test_malformed_quantity_is_ignored(self):
+        self.client.get(reverse("add_to_cart", args=[self.products[0].id]))
+        response = self.client.post(reverse("update_quantity", args=[self.products[0].id]), {"quantity": "lots"})
+        self.assertRedirects(response, reverse("view_cart"))
+        items = self.client.get(reverse("view_cart")).context["items"]
+        self.assertEqual([line.quantity for line in items], [1])
+
+        self.client.force_login(self.user)
+        item = CartItem.objects.create(cart=Cart.objects.create(user=self.user), product=self.products[1])
+        response = self.client.post(reverse("update_quantity", args=[item.id]), {"quantity": ""})
+        self.assertRedirects(response, reverse("view_cart"))
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 1)
+
+    def test_login_merges_guest_cart(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.products[0], quantity=2)
+
+        self.client.get(reverse("add_to_cart", args=[self.products[0].id]))
+        self.client.get(reverse("add_to_cart", args=[self.products[1].id]))
+        response = self.client.post(reverse("login"), {"username": "shopper", "password": "pass12345"})
+
+        quantities = dict(cart.items.values_list("product_id", "quantity"))
+        self.assertEqual(quantities, {self.products[0].id: 3, self.products[1].id: 1})
+        self.assertEqual(response.cookies["guest_cart"].value, "")
+        self.assertEqual(self.client.get(reverse("view_cart")).context["cart_item_count"](), 2)
+
+
+class AtomicCartMutationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Books", slug="books")
+        cls.products = [
+            Product.objects.create(category=category, name=f"Book {i}", slug=f"book-{i}", price=100)
+            for i in range(3)
+        ]
+        cls.user = User.objects.create_user("shopper", password="pass12345")
+        cls.cart = Cart.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_add_to_cart_increments_in_one_statement(self):
+        url = reverse("add_to_cart", args=[self.products[0].id])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        writes = [q["sql"] for q in ctx.captured_queries if not q["sql"].startswith("SELECT")]
+        self.assertEqual(len(writes), 1)
+        self.assertIn("ON CONFLICT", writes[0])
+        self.assertEqual(self.cart.items.get().quantity, 2)
+
+    def test_bulk_update_sets_and_deletes(self):
+        lines = [CartItem.objects.create(cart=self.cart, product=p) for p in self.products]
+        other = User.objects.create_user("other")
+        foreign = CartItem.objects.create(cart=Cart.objects.create(user=other), product=self.products[0])
+
+        response = self.client.post(
+            reverse("update_quantities"),
+            json.dumps({"quantities": {lines[0].id: 4, lines[1].id: 0, foreign.id: 9}}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.json(), {"updated": 2, "count": 2, "total": "500.00"})
+        self.assertEqual(dict(self.cart.items.values_list("id", "quantity")), {lines[0].id: 4, lines[2].id: 1})
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.quantity, 1)
+
+    def test_bulk_update_rejects_bad_payload(self):
+        response = self.client.post(reverse("update_quantities"), "nope", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+
+class ConcurrentAddToCartTests(TransactionTestCase):
+
+    def test_concurrent_increments_are_not_lost(self):
+        category = Category.objects.create(name="Books", slug="books")
+        product = Product.objects.create(category=category, name="Book", slug="book", price=100)
+        cart = Cart.objects.create(user=User.objects.create_user("shopper"))
+        threads, per_thread = 8, 25
+        applied = []
+
+        def worker():
+            try:
+                for _ in range(per_thread):
+                    while True:
+                        try:
+                            CartItem.objects.add_quantities(cart.id, {product.id: 1})
+                            applied.append(1)
+                            break
+                        except OperationalError:
+                            # SQLite "database is locked": retry, the write never happened
+                            continue
+            finally:
+                close_old_connections()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+
+        self.assertEqual(len(applied), threads * per_thread)
+        self.assertEqual(CartItem.objects.get(cart=cart, product=product).quantity, threads * per_thread)
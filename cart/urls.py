@@ -6,4 +6,5 @@ urlpatterns = [
     path('add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('remove/<int:item_id>/', views.remove_cart_item, name='remove_cart_item'),
     path('update/<int:item_id>/', views.update_quantity, name='update_quantity'),
+    path('update/', views.update_quantities, name='update_quantities'),
 ]
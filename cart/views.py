@@ -1,57 +1,115 @@
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_POST
 from .models import Cart, CartItem
+from .caching import invalidate_cart_count
+from .guest import GuestCart
 from store.models import Product
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 
 # Add product to cart
-@login_required
 def add_to_cart(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
+    product = get_object_or_404(Product.objects.only('id'), id=product_id)
+
+    # Guests: signed cookie only, no database writes
+    if not request.user.is_authenticated:
+        guest = GuestCart(request)
+        if not guest.add(product.id):
+            messages.error(request, "Your cart is full. Log in to add more items.")
+        response = redirect('home')
+        guest.save(response)
+        return response
+
     cart, created = Cart.objects.get_or_create(user=request.user)
 
-    cart_item, created_item = CartItem.objects.get_or_create(cart=cart, product=product)
-    if not created_item:
-        cart_item.quantity += 1
-        cart_item.save()
+    # Single INSERT ... ON CONFLICT: increments can't be lost between tabs
+    CartItem.objects.add_quantities(cart.id, {product.id: 1})
+    invalidate_cart_count(request.user.id)
 
     return redirect('home')
 
 
 # View Cart
-@login_required
 def view_cart(request):
+    if not request.user.is_authenticated:
+        items, total = GuestCart(request).lines()
+        return render(request, 'cart/view_cart.html', {'items': items, 'total': total})
+
     cart, created = Cart.objects.get_or_create(user=request.user)
-    items = cart.items.all()
-    total = cart.get_total()
-    return render(request, 'cart/view_cart.html', {'cart': cart, 'items': items, 'total': total})
+    summary = cart.summary
+    return render(request, 'cart/view_cart.html', {
+        'cart': cart,
+        'items': summary.lines,
+        'total': summary.total,
+    })
 
 
-# Remove item from cart
-@login_required
+# Remove item from cart (guest carts are keyed by product id)
 def remove_cart_item(request, item_id):
+    if not request.user.is_authenticated:
+        guest = GuestCart(request)
+        guest.remove(item_id)
+        response = redirect('view_cart')
+        guest.save(response)
+        return response
+
     item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
     item.delete()
+    invalidate_cart_count(request.user.id)
     return redirect('view_cart')
 
 
-# Update quantity
-@login_required
+def parse_quantity(value):
+    # Malformed input is ignored rather than raising
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Update quantity (guest carts are keyed by product id)
 def update_quantity(request, item_id):
-    item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
-    if request.method == "POST":
-        quantity = int(request.POST.get("quantity", 1))
-        if quantity > 0:
-            item.quantity = quantity
-            item.save()
-        else:
-            item.delete()
+    quantity = parse_quantity(request.POST.get("quantity", 1)) if request.method == "POST" else None
+
+    if not request.user.is_authenticated:
+        guest = GuestCart(request)
+        if quantity is not None:
+            guest.set(item_id, quantity)
+        response = redirect('view_cart')
+        guest.save(response)
+        return response
+
+    if quantity is not None:
+        if not CartItem.objects.set_quantities(request.user, {item_id: quantity}):
+            raise Http404("No CartItem matches the given query.")
+        invalidate_cart_count(request.user.id)
     return redirect('view_cart')
 
-def _cart_id(request):
-    cart = request.session.session_key
-    if not cart:
-        cart = request.session.create()
-    return cart
+
+# Update many quantities at once: {"quantities": {"<item_id>": <quantity>, ...}}
+@login_required
+@require_POST
+def update_quantities(request):
+    try:
+        quantities = {
+            int(item_id): int(quantity)
+            for item_id, quantity in json.loads(request.body)["quantities"].items()
+        }
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({"error": "Expected {\"quantities\": {item_id: quantity}}"}, status=400)
+
+    updated = CartItem.objects.set_quantities(request.user, quantities)
+    invalidate_cart_count(request.user.id)
+    cart, created = Cart.objects.get_or_create(user=request.user)
+    summary = cart.summary
+    return JsonResponse({
+        "updated": updated,
+        "count": summary.item_count,
+        "total": str(summary.total),
+    })
 
 
 @login_required
@@ -1,10 +1,24 @@
 from django.contrib import admin
-from .models import Payment, Order, OrderItem, Shipment
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .invoices import export_invoices
+from .models import Payment, Order, OrderItem, Shipment, ShipmentEvent
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
 
+class ShipmentEventInline(admin.TabularInline):
+    model = ShipmentEvent
+    extra = 0
+    ordering = ('-occurred_at',)
+    readonly_fields = ('status', 'location', 'occurred_at', 'received_at')
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ('user', 'method', 'amount', 'status', 'created_at')
@@ -16,7 +30,23 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'status', 'total_amount', 'created_at')
     list_filter = ('status', 'created_at')
     inlines = [OrderItemInline]
+    date_hierarchy = 'created_at'
+    actions = ['cancel_orders', 'export_invoices']
+
+    @admin.action(description="Cancel selected orders and restore stock")
+    def cancel_orders(self, request, queryset):
+        cancelled = queryset.cancel()
+        self.message_user(request, f"Cancelled {len(cancelled)} of {queryset.count()} selected orders.")
+
+    @admin.action(description="Download invoices for selected orders (ZIP)")
+    def export_invoices(self, request, queryset):
+        response = StreamingHttpResponse(export_invoices(queryset), content_type='application/zip')
+        filename = f"invoices-{timezone.localdate():%Y%m%d}.zip"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
 @admin.register(Shipment)
 class ShipmentAdmin(admin.ModelAdmin):
-    list_display = ('order', 'tracking_no', 'status', 'shipped_date', 'delivery_date')
\ No newline at end of file
+    list_display = ('order', 'tracking_no', 'status', 'shipped_date', 'delivery_date')
+    search_fields = ('tracking_no',)
+    inlines = [ShipmentEventInline]
@@ -0,0 +1,50 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Shipment
+
+# Couriers poll constantly; a short TTL bounds staleness if an invalidation is missed
+TRACKING_CACHE_TIMEOUT = 60
+
+
+def tracking_key(tracking_no):
+    return 'orders:tracking:' + hashlib.md5(tracking_no.encode()).hexdigest()
+
+
+def get_tracking(tracking_no):
+    """Public tracking info for a shipment as a plain dict, or None if unknown.
+
+    Cached per tracking number; ``etag`` is a hash of the other fields.
+    """
+    key = tracking_key(tracking_no)
+    tracking = cache.get(key)
+    if tracking is not None:
+        return tracking
+
+    shipment = (
+        Shipment.objects.select_related('order')
+        .only('tracking_no', 'courier_name', 'status', 'shipped_date', 'delivery_date', 'order__id')
+        .filter(tracking_no=tracking_no)
+        .first()
+    )
+    if shipment is None:
+        return None
+    tracking = {
+        'order_id': shipment.order.id,
+        'tracking_no': shipment.tracking_no,
+        'courier': shipment.courier_name,
+        'status': shipment.status,
+        'shipped_date': shipment.shipped_date,
+        'delivery_date': shipment.delivery_date,
+    }
+    payload = json.dumps(tracking, cls=DjangoJSONEncoder, sort_keys=True)
+    tracking['etag'] = hashlib.md5(payload.encode()).hexdigest()
+    cache.set(key, tracking, TRACKING_CACHE_TIMEOUT)
+    return tracking
+
+
+def invalidate_tracking(*tracking_nos):
+    cache.delete_many([tracking_key(tracking_no) for tracking_no in tracking_nos])
@@ -0,0 +1,233 @@
+import csv
+import json
+from itertools import islice
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .caching import invalidate_tracking
+from .models import Shipment, ShipmentEvent
+
+INGEST_CHUNK_SIZE = 5000
+STATUSES = {code for code, _label in Shipment.STATUS_CHOICES}
+SHIPMENT_FIELDS = ['status', 'status_at', 'shipped_date', 'delivery_date']
+
+
+class IngestResult:
+    def __init__(self):
+        self.created = 0
+        self.duplicate = 0
+        self.updated = 0
+        self.unknown = 0
+        self.invalid = 0
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'duplicate': self.duplicate,
+            'updated': self.updated,
+            'unknown': self.unknown,
+            'invalid': self.invalid,
+        }
+
+
+def parse_events(stream, fmt):
+    """Yield raw event dicts from JSON-lines or CSV text lines.
+
+    Each event has ``tracking_no``, ``status``, ``occurred_at`` (ISO 8601)
+    and optionally ``location``; CSV input needs a header row with those
+    column names. Malformed JSON lines, and lines passed in as None, are
+    yielded as None.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for line in stream:
+            if line is None:
+                # Undecodable bytes (see ingest_stream())
+                yield None
+                continue
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f"Unsupported event format: {fmt!r}")
+
+
+def _clean(row):
+    if not row:
+        return None
+    tracking_no = row.get('tracking_no')
+    status = row.get('status')
+    occurred_at = row.get('occurred_at')
+    location = row.get('location') or ''
+    # JSON can carry any type; anything but strings is a bad row, not a crash
+    if not all(isinstance(value, str) for value in (tracking_no, status, occurred_at, location)):
+        return None
+    try:
+        occurred_at = parse_datetime(occurred_at)
+    except ValueError:
+        occurred_at = None
+    if not tracking_no or status not in STATUSES or occurred_at is None:
+        return None
+    if timezone.is_naive(occurred_at):
+        occurred_at = timezone.make_aware(occurred_at)
+    return tracking_no, status, occurred_at, location[:100]
+
+
+def ingest_events(rows, chunk_size=INGEST_CHUNK_SIZE):
+    """Append courier events and move each shipment to its latest status.
+
+    ``rows`` is any iterable of event dicts (see ``parse_events()``). Work
+    is done ``chunk_size`` events at a time: one ``IN`` query resolves the
+    tracking numbers, then the events are appended and the changed
+    shipments saved with one multi-row statement per batch, in one
+    transaction per chunk. Events older than a shipment's current status are logged
+    but don't move it backwards.
+    """
+    result = IngestResult()
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        _ingest_chunk(chunk, result)
+    return result
+
+
+def _ingest_chunk(chunk, result):
+    events = []
+    for row in chunk:
+        event = _clean(row)
+        if event is None:
+            result.invalid += 1
+        else:
+            events.append(event)
+    if not events:
+        return
+
+    with transaction.atomic():
+        # Plain rows rather than model instances: building tens of
+        # thousands of objects per chunk costs more than the SQL
+        shipments = {
+            row[0]: list(row[1:])
+            for row in Shipment.objects.filter(tracking_no__in={e[0] for e in events})
+            .select_for_update()
+            .values_list('tracking_no', 'id', *SHIPMENT_FIELDS)
+        }
+
+        new_events = []
+        changed = {}
+        for tracking_no, status, occurred_at, location in events:
+            shipment = shipments.get(tracking_no)
+            if shipment is None:
+                result.unknown += 1
+                continue
+            shipment_id, _status, status_at, shipped_date, delivery_date = shipment
+            new_events.append((shipment_id, status, location, occurred_at))
+            if status == 'SHIPPED' and shipped_date is None:
+                shipment[3] = occurred_at
+                changed[tracking_no] = shipment
+            if status == 'DELIVERED' and delivery_date is None:
+                shipment[4] = occurred_at
+                changed[tracking_no] = shipment
+            if status_at is None or occurred_at >= status_at:
+                shipment[1] = status
+                shipment[2] = occurred_at
+                changed[tracking_no] = shipment
+
+        created = insert_events(new_events)
+        update_shipments(list(changed.values()))
+        # Raw writes send no signals, so drop the tracking snapshots here
+        tracking_nos = list(changed)
+        transaction.on_commit(lambda: invalidate_tracking(*tracking_nos))
+
+    result.created += created
+    result.duplicate += len(new_events) - created
+    result.updated += len(changed)
+
+
+def _batches(rows, params_per_row):
+    limit = connection.features.max_query_params or 5000
+    size = max(1, limit // params_per_row)
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def insert_events(events):
+    """Append ``(shipment_id, status, location, occurred_at)`` rows to the event log.
+
+    A multi-row INSERT per batch. ``bulk_create()`` runs every value through
+    the model field machinery, which measured at over half the ingestion
+    time; the only value that needs adapting here is the timestamp. Events
+    already logged are skipped, so a retried delivery is harmless. Returns
+    the number of rows inserted.
+    """
+    table = ShipmentEvent._meta.db_table
+    adapt = connection.ops.adapt_datetimefield_value
+    received_at = adapt(timezone.now())
+    inserted = 0
+    with connection.cursor() as cursor:
+        for batch in _batches(events, 5):
+            rows = ', '.join(['(%s, %s, %s, %s, %s)'] * len(batch))
+            params = []
+            for shipment_id, status, location, occurred_at in batch:
+                params += [shipment_id, status, location, adapt(occurred_at), received_at]
+            cursor.execute(
+                f"INSERT INTO {table} (shipment_id, status, location, occurred_at, received_at) VALUES {rows} "
+                f"ON CONFLICT (shipment_id, occurred_at, status) DO NOTHING",
+                params,
+            )
+            inserted += cursor.rowcount
+    return inserted
+
+
+def update_shipments(shipments):
+    """Save ``[id, status, status_at, shipped_date, delivery_date]`` rows, one statement per batch.
+
+    ``bulk_update()`` builds a CASE/WHEN expression per object and field in
+    Python, which capped ingestion at about a thousand events a second.
+    The rows are joined in from a VALUES list instead (``UPDATE ... FROM``,
+    SQLite 3.33+ and PostgreSQL).
+    """
+    table = Shipment._meta.db_table
+    # PostgreSQL can't infer a type for a VALUES column that is all NULLs
+    ts = '%s::timestamptz' if connection.vendor == 'postgresql' else '%s'
+    adapt = connection.ops.adapt_datetimefield_value
+    with connection.cursor() as cursor:
+        for batch in _batches(shipments, 5):
+            rows = ', '.join([f'(%s, %s, {ts}, {ts}, {ts})'] * len(batch))
+            params = []
+            for shipment_id, status, status_at, shipped_date, delivery_date in batch:
+                params += [shipment_id, status, adapt(status_at), adapt(shipped_date), adapt(delivery_date)]
+            cursor.execute(
+                f"WITH v (id, status, status_at, shipped_date, delivery_date) AS (VALUES {rows}) "
+                f"UPDATE {table} SET status = v.status, status_at = v.status_at, "
+                f"shipped_date = v.shipped_date, delivery_date = v.delivery_date "
+                f"FROM v WHERE {table}.id = v.id",
+                params,
+            )
+
+
+def ingest_stream(lines, fmt, chunk_size=INGEST_CHUNK_SIZE):
+    """Parse and ingest an iterable of lines (bytes or str), e.g. an open file or request."""
+    return ingest_events(parse_events(_decode(lines, fmt), fmt), chunk_size=chunk_size)
+
+
+def _decode(lines, fmt):
+    # Line by line, so one bad byte sequence costs one event, not the batch:
+    # a JSON line that isn't UTF-8 becomes None (counted invalid), while CSV
+    # cells get replacement characters and are validated like any other
+    errors = 'replace' if fmt == 'csv' else 'strict'
+    for line in lines:
+        if isinstance(line, bytes):
+            try:
+                line = line.decode('utf-8', errors)
+            except UnicodeDecodeError:
+                line = None
+        yield line
@@ -0,0 +1,237 @@
+import glob
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+logger = logging.getLogger(__name__)
+
+INVOICE_DIR = 'invoices'
+# Rendering is CPU-bound and reportlab holds the GIL, so a couple of
+# threads is enough to keep it off the request path
+INVOICE_WORKERS = 2
+
+_executor = ThreadPoolExecutor(max_workers=INVOICE_WORKERS, thread_name_prefix='invoice')
+
+# Bulk export: orders fetched per query, and renders in flight per worker
+EXPORT_CHUNK_SIZE = 500
+EXPORT_QUEUE_PER_WORKER = 4
+
+
+def invoice_data(order):
+    """Everything printed on the invoice, as plain JSON-able values.
+
+    ``order`` should come from ``Order.objects.for_invoice()``.
+    """
+    address = order.shipping_address or (order.address.full_address() if order.address else '')
+    return {
+        'id': order.id,
+        'date': order.created_at.strftime('%Y-%m-%d'),
+        'customer': order.user.username,
+        'payment_method': order.payment.method if order.payment else '',
+        'payment_status': order.payment.status if order.payment else '',
+        'address': address,
+        'items': [
+            [item.product.name if item.product else 'Unavailable product', item.quantity, str(item.price)]
+            for item in order.items.all()
+        ],
+        'total': str(order.total_amount),
+    }
+
+
+def invoice_digest(data):
+    """Content hash of ``invoice_data()``; it changes exactly when the PDF would."""
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()[:20]
+
+
+def invoice_path(order_id, digest):
+    # One directory per order keeps the stale-file sweep in write_invoice()
+    # cheap no matter how many invoices exist
+    return os.path.join(settings.MEDIA_ROOT, INVOICE_DIR, str(order_id), f'{digest}.pdf')
+
+
+def render_invoice(data, fp):
+    p = canvas.Canvas(fp, pagesize=letter)
+    width, height = letter
+    bottom = 60
+
+    def header():
+        p.setFont("Helvetica-Bold", 16)
+        p.drawString(30, height - 50, "BUYBUDDY - OFFICIAL INVOICE")
+        p.setFont("Helvetica", 10)
+        p.drawRightString(width - 30, height - 50, f"BB-INV-{data['id']} - page {p.getPageNumber()}")
+
+    header()
+    p.setFont("Helvetica", 12)
+    p.drawString(30, height - 90, f"Invoice No: BB-INV-{data['id']}")
+    p.drawString(30, height - 110, f"Order Date: {data['date']}")
+    p.drawString(30, height - 130, f"Customer: {data['customer']}")
+    p.drawString(30, height - 150, f"Payment Method: {data['payment_method']}")
+    p.drawString(30, height - 170, f"Payment Status: {data['payment_status']}")
+
+    # Address
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(30, height - 210, "Shipping Address:")
+    p.setFont("Helvetica", 12)
+    p.drawString(30, height - 230, data['address'])
+
+    # Items table, continued on as many pages as it takes
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(30, height - 270, "Order Items:")
+
+    y = height - 300
+    p.setFont("Helvetica", 12)
+    for name, quantity, price in data['items']:
+        if y < bottom:
+            p.showPage()
+            header()
+            y = height - 90
+            p.setFont("Helvetica", 12)
+        p.drawString(30, y, f"{name} (x{quantity}) - Rs {price}")
+        y -= 20
+
+    # Total
+    if y - 20 < bottom:
+        p.showPage()
+        header()
+        y = height - 70
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(30, y - 20, f"Total Amount: Rs {data['total']}")
+
+    p.showPage()
+    p.save()
+
+
+def get_invoice(order):
+    """Return ``(path, digest)`` for the order's current invoice, rendering it if needed.
+
+    Files are keyed by order id and content hash, so an unchanged order is
+    never rendered twice and a changed one gets a fresh file; older
+    renders of the same order are removed.
+    """
+    data = invoice_data(order)
+    digest = invoice_digest(data)
+    path = invoice_path(order.id, digest)
+    if not os.path.exists(path):
+        write_invoice(data, path)
+    return path, digest
+
+
+def write_invoice(data, path):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Render to a temporary file and rename, so a concurrent download never
+    # sees a half-written PDF
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            render_invoice(data, fp)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    for stale in glob.glob(os.path.join(directory, '*.pdf')):
+        if stale != path:
+            try:
+                os.unlink(stale)
+            except FileNotFoundError:
+                pass
+
+
+def _generate(order_id):
+    from .models import Order
+
+    try:
+        order = Order.objects.for_invoice().filter(id=order_id).first()
+        if order is not None:
+            get_invoice(order)
+    except Exception:
+        logger.exception("Rendering invoice for order %s failed", order_id)
+    finally:
+        connections.close_all()
+
+
+def generate_invoice_async(order_id):
+    """Render the invoice in the background; call after the order commits."""
+    return _executor.submit(_generate, order_id)
+
+
+def _render_to_path(data, path):
+    # Runs in an export worker process: no database access, just reportlab
+    if not os.path.exists(path):
+        write_invoice(data, path)
+    return path
+
+
+class _ZipStream:
+    """Write-only file object that hands each written chunk back to the caller.
+
+    ZipFile falls back to data descriptors when the file can't seek, so the
+    archive can be streamed out as it's built.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return b''.join(chunks)
+
+
+def export_invoices(orders, workers=None):
+    """Yield a ZIP archive of the invoices for ``orders``, chunk by chunk.
+
+    Orders are read in chunks of ``EXPORT_CHUNK_SIZE`` with their lines
+    prefetched, missing invoices are rendered by a process pool, and at most
+    a few renders per worker are in flight, so memory stays flat however
+    many orders there are. Every rendered invoice is also kept in the
+    per-order cache, so exporting the same range again mostly reads files.
+    """
+    workers = workers or os.cpu_count() or 1
+    stream = _ZipStream()
+    archive = zipfile.ZipFile(stream, mode='w', compression=zipfile.ZIP_DEFLATED)
+    pending = deque()
+
+    def add(order_id, path):
+        if isinstance(path, Future):
+            path = path.result()
+        with open(path, 'rb') as fp:
+            archive.writestr(f"Invoice_{order_id}.pdf", fp.read())
+        return stream.drain()
+
+    # Spawned rather than forked workers: the parent may be a threaded web
+    # server process holding locks a forked child would inherit
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        for order in orders.for_invoice().order_by('id').iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            data = invoice_data(order)
+            path = invoice_path(order.id, invoice_digest(data))
+            if os.path.exists(path):
+                pending.append((order.id, path))
+            else:
+                pending.append((order.id, pool.submit(_render_to_path, data, path)))
+            while len(pending) > workers * EXPORT_QUEUE_PER_WORKER:
+                yield add(*pending.popleft())
+        while pending:
+            yield add(*pending.popleft())
+
+    archive.close()
+    yield stream.drain()
@@ -0,0 +1,80 @@
+import time
+from statistics import median
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from accounts.models import Address
+from cart.models import Cart, CartItem
+from orders.models import Order, Payment
+from store.models import Category, Product
+
+BENCH_PREFIX = "bench-checkout-"
+
+
+class Command(BaseCommand):
+    help = "Measure place_order latency and query count for carts of increasing size"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lines", type=int, nargs="+", default=[1, 10, 100])
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        category, _ = Category.objects.get_or_create(
+            slug="bench-checkout", defaults={"name": "Bench Checkout"}
+        )
+        user, _ = User.objects.get_or_create(username=f"{BENCH_PREFIX}user")
+        address = Address.objects.create(
+            user=user, full_name="Bench", phone="9999999999", address_line="1 Bench St",
+            city="Kochi", state="Kerala", postal_code="682001",
+        )
+        products = Product.objects.bulk_create([
+            Product(category=category, name=f"Bench product {i}", slug=f"{BENCH_PREFIX}{i}",
+                    price=(i % 500) + 1, stock=1_000_000)
+            for i in range(max(options["lines"]))
+        ])
+        cart, _ = Cart.objects.get_or_create(user=user)
+
+        # ALLOWED_HOSTS doesn't include the test client's default "testserver"
+        client = Client(HTTP_HOST="localhost")
+        client.force_login(user)
+        url = reverse("place_order")
+
+        # Each order would queue a PDF render into MEDIA_ROOT (left behind
+        # once the orders are deleted) and compete with the timed requests
+        # for the GIL, so invoices are skipped while benchmarking
+        no_invoices = override_settings(INVOICE_PRERENDER=False)
+        no_invoices.enable()
+        try:
+            for lines in options["lines"]:
+                timings, queries = [], 0
+                for _ in range(options["repeat"]):
+                    CartItem.objects.bulk_create([
+                        CartItem(cart=cart, product=product, quantity=2) for product in products[:lines]
+                    ])
+                    session = client.session
+                    session["checkout_address"] = address.id
+                    session["checkout_payment"] = "COD"
+                    session.save()
+
+                    with CaptureQueriesContext(connection) as ctx:
+                        start = time.perf_counter()
+                        client.get(url)
+                        timings.append((time.perf_counter() - start) * 1000)
+                    queries = len(ctx.captured_queries)
+                self.stdout.write(
+                    f"{lines:>4} lines: {median(timings):7.2f} ms, {queries} queries "
+                    f"(median of {options['repeat']})"
+                )
+        finally:
+            no_invoices.disable()
+            Order.objects.filter(user=user).delete()
+            Payment.objects.filter(user=user).delete()
+            Product.objects.filter(slug__startswith=BENCH_PREFIX).delete()
+            category.delete()
+            user.delete()
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark finished"))
@@ -0,0 +1,69 @@
+import json
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from orders.ingest import INGEST_CHUNK_SIZE, ingest_stream
+from orders.models import Order, Shipment, ShipmentEvent
+
+BENCH_PREFIX = "BENCHEV"
+STATUSES = ["PROCESSING", "SHIPPED", "OUT_FOR_DELIVERY", "DELIVERED"]
+
+
+class Command(BaseCommand):
+    help = "Measure courier event ingestion throughput (events/sec) from JSON lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shipments", type=int, default=20_000)
+        parser.add_argument("--events", type=int, default=100_000)
+        parser.add_argument("--chunk-size", type=int, default=INGEST_CHUNK_SIZE)
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded orders and events")
+
+    def seed(self, count):
+        user, _ = User.objects.get_or_create(username=f"{BENCH_PREFIX.lower()}-user")
+        with transaction.atomic():
+            for start in range(0, count, 5000):
+                orders = Order.objects.bulk_create([
+                    Order(user=user, total_amount=100) for _ in range(start, min(start + 5000, count))
+                ])
+                Shipment.objects.bulk_create([
+                    Shipment(order=order, tracking_no=f"{BENCH_PREFIX}{start + i}", status="PLACED")
+                    for i, order in enumerate(orders)
+                ])
+        return user
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"🟢 Seeding {options['shipments']} shipments...")
+        user = self.seed(options["shipments"])
+
+        now = timezone.now()
+        rng = random.Random(0)
+        lines = [
+            json.dumps({
+                "tracking_no": f"{BENCH_PREFIX}{rng.randrange(options['shipments'])}",
+                "status": rng.choice(STATUSES),
+                "occurred_at": (now + timedelta(seconds=i)).isoformat(),
+                "location": "Kochi Hub",
+            }) + "\n"
+            for i in range(options["events"])
+        ]
+
+        try:
+            start = time.perf_counter()
+            result = ingest_stream(lines, "jsonl", chunk_size=options["chunk_size"])
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{result.created} events, {result.updated} shipment updates in {elapsed:.2f}s: "
+                f"{result.created / elapsed:,.0f} events/sec (chunk size {options['chunk_size']})"
+            )
+        finally:
+            if not options["keep"]:
+                ShipmentEvent.objects.filter(shipment__order__user=user).delete()
+                Order.objects.filter(user=user).delete()
+                user.delete()
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark finished"))
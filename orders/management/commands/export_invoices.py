@@ -0,0 +1,37 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.invoices import export_invoices
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = "Export the invoices of orders placed in a date range as one ZIP file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", type=date.fromisoformat, required=True, help="YYYY-MM-DD")
+        parser.add_argument("--to", dest="end", type=date.fromisoformat, required=True, help="YYYY-MM-DD, inclusive")
+        parser.add_argument("--output", "-o", required=True)
+        parser.add_argument("--workers", type=int, default=None, help="Render processes (default: CPU count)")
+
+    def handle(self, *args, **options):
+        if options["start"] > options["end"]:
+            raise CommandError("--from must not be after --to")
+
+        orders = Order.objects.filter(created_at__date__range=(options["start"], options["end"]))
+        count = orders.count()
+        self.stdout.write(f"🟢 Exporting {count} invoices...")
+
+        started = time.perf_counter()
+        size = 0
+        with open(options["output"], "wb") as fp:
+            for chunk in export_invoices(orders, workers=options["workers"]):
+                fp.write(chunk)
+                size += len(chunk)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Wrote {count} invoices ({size / 1024 / 1024:.1f} MB) to {options['output']} "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.ingest import INGEST_CHUNK_SIZE, ingest_stream
+
+
+class Command(BaseCommand):
+    help = "Ingest courier shipment events from a JSON-lines or CSV file ('-' for stdin)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["jsonl", "csv"], help="Default: from the file extension")
+        parser.add_argument("--chunk-size", type=int, default=INGEST_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("csv" if path.endswith(".csv") else "jsonl")
+        if path == "-":
+            result = ingest_stream(sys.stdin.buffer, fmt, chunk_size=options["chunk_size"])
+        else:
+            try:
+                # Binary, so ingest_stream() can decode (and reject) line by line
+                with open(path, "rb") as fp:
+                    result = ingest_stream(fp, fmt, chunk_size=options["chunk_size"])
+            except FileNotFoundError:
+                raise CommandError(f"No such file: {path}")
+
+        self.stdout.write(self.style.SUCCESS(
+            "✅ {created} events logged, {duplicate} already logged, {updated} shipment updates, "
+            "{unknown} unknown tracking numbers, {invalid} invalid rows".format(**result.as_dict())
+        ))
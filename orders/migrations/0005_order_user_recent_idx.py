@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_delete_seller'),
+        ('orders', '0004_order_shipping_address_order_shipping_full_name_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='order_user_recent_idx'),
+        ),
+    ]
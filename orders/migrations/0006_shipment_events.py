@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_user_recent_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='status_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ShipmentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PLACED', 'Order Placed'), ('PROCESSING', 'Processing'), ('SHIPPED', 'Shipped'), ('OUT_FOR_DELIVERY', 'Out for Delivery'), ('DELIVERED', 'Delivered')], max_length=50)),
+                ('location', models.CharField(blank=True, max_length=100)),
+                ('occurred_at', models.DateTimeField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('shipment', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='events', to='orders.shipment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['shipment', 'occurred_at'], name='shipment_event_timeline_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_shipment_events'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='shipmentevent',
+            name='shipment_event_timeline_idx',
+        ),
+        # Retried deliveries may already have logged the same event twice
+        migrations.RunSQL(
+            "DELETE FROM orders_shipmentevent WHERE id NOT IN ("
+            "SELECT MIN(id) FROM orders_shipmentevent GROUP BY shipment_id, occurred_at, status)",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='shipmentevent',
+            constraint=models.UniqueConstraint(fields=('shipment', 'occurred_at', 'status'), name='shipment_event_unique'),
+        ),
+    ]
@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery, Sum
 from django.contrib.auth.models import User
-from store.models import Product
+from django.utils import timezone
+from store.models import Product, ProductImage, featured_image_prefetch
 from accounts.models import Address
 
 # Payment Model
@@ -23,6 +25,86 @@ class Payment(models.Model):
         return f"{self.user.username} - {self.method} - {self.status}"
 
 
+# Order QuerySet
+class OrderQuerySet(models.QuerySet):
+
+    def with_summary(self):
+        """Annotate what an order card shows, without touching the lines.
+
+        ``item_count`` is the number of lines and ``thumbnail`` the image
+        path of the first line's product (featured image first), both as
+        correlated subqueries so a page of orders stays one query.
+        """
+        lines = OrderItem.objects.filter(order=OuterRef('pk'))
+        first_product = lines.order_by('id').values('product')[:1]
+        thumbnail = ProductImage.objects.filter(
+            product=Subquery(first_product)
+        ).order_by('-is_featured', 'id').values('image')[:1]
+        item_count = lines.order_by().values('order').annotate(n=Count('id')).values('n')
+        return self.select_related('payment', 'shipment').annotate(
+            item_count=Subquery(item_count, output_field=IntegerField()),
+            thumbnail=Subquery(thumbnail),
+        )
+
+    def for_detail(self):
+        """Everything the order page shows, in a fixed number of queries.
+
+        Lines come with their product and review, and one image per
+        product is prefetched for ``product.featured_image``.
+        """
+        return self.select_related('payment', 'shipment', 'address').prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product', 'review').order_by('id')),
+            featured_image_prefetch('items__product__images'),
+        )
+
+    def for_invoice(self):
+        return self.select_related('user', 'payment', 'address').prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product').order_by('id')),
+        )
+
+    def cancel(self):
+        """Cancel every order here that isn't delivered or already cancelled.
+
+        Used by the customer's cancel button and the admin bulk action. The
+        statement count doesn't depend on how many orders or lines there
+        are: one locked read, one UPDATE each for orders, refunds and
+        shipments, and one F() UPDATE restoring stock summed per product,
+        so concurrent stock changes are never overwritten. Returns the
+        orders that were cancelled.
+        """
+        from .caching import invalidate_tracking
+
+        with transaction.atomic():
+            orders = list(
+                self.exclude(status__in=['DELIVERED', 'CANCELLED'])
+                .select_related('payment', 'shipment')
+                .select_for_update(of=('self',))
+                .order_by('id')
+            )
+            if not orders:
+                return []
+            ids = [order.id for order in orders]
+
+            Order.objects.filter(id__in=ids).update(status='CANCELLED', updated_at=timezone.now())
+            # Online payments are refunded, COD had nothing taken
+            Payment.objects.filter(order__in=ids).exclude(method='COD').update(status='Refunded')
+            Shipment.objects.filter(order__in=ids).update(status='Order Cancelled')
+            # update() sends no signals, so drop the public tracking pages here
+            tracking_nos = [order.shipment.tracking_no for order in orders if hasattr(order, 'shipment')]
+            transaction.on_commit(lambda: invalidate_tracking(*tracking_nos))
+
+            restock = dict(
+                OrderItem.objects.filter(order__in=ids, product__isnull=False)
+                .values('product_id').annotate(total=Sum('quantity')).order_by()
+                .values_list('product_id', 'total')
+            )
+            Product.objects.restock(restock)
+
+        for order in orders:
+            order.status = 'CANCELLED'
+        return orders
+
+
 # Order Model
 class Order(models.Model):
     ORDER_STATUS = (
@@ -49,6 +131,14 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # my_orders keyset pagination
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_recent_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} by {self.user.username}"
 
@@ -85,6 +175,28 @@ class Shipment(models.Model):
     shipped_date = models.DateTimeField(blank=True, null=True)
     delivery_date = models.DateTimeField(blank=True, null=True)
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='PLACED')
+    # When the courier reported the current status; older events don't overwrite it
+    status_at = models.DateTimeField(blank=True, null=True)
     return_status = models.CharField(max_length=20, default="NONE")
 
 
+# Shipment Event Model (append-only courier status log)
+class ShipmentEvent(models.Model):
+    # Covered by the unique timeline index below, so no separate FK index to maintain on insert
+    shipment = models.ForeignKey(Shipment, on_delete=models.CASCADE, related_name='events', db_index=False)
+    status = models.CharField(max_length=50, choices=Shipment.STATUS_CHOICES)
+    location = models.CharField(max_length=100, blank=True)
+    occurred_at = models.DateTimeField()
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Doubles as the timeline index; a redelivered event is skipped
+            # instead of appended twice (see orders.ingest.insert_events)
+            models.UniqueConstraint(fields=['shipment', 'occurred_at', 'status'], name='shipment_event_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.shipment.tracking_no} {self.status} @ {self.occurred_at}"
+
+
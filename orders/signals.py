@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import invalidate_tracking
+from .models import Shipment
+
+
+# Invalidate after commit, so a reader can't re-cache old data mid-transaction
+
+@receiver([post_save, post_delete], sender=Shipment)
+def shipment_changed(sender, instance, **kwargs):
+    tracking_no = instance.tracking_no
+    transaction.on_commit(lambda: invalidate_tracking(tracking_no))
@@ -1,3 +1,533 @@
+import json
+import os
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
 from django.test import TestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Address
+from cart.models import Cart, CartItem
+from store.models import Category, Product, ProductImage, StockReservation
+from .invoices import get_invoice
+from .models import Order, OrderItem, Payment, Shipment
+from .views import ORDERS_PER_PAGE
+
+
+class OrderTestMixin:
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Books", slug="books")
+        cls.user = User.objects.create_user("buyer", password="pass12345")
+        cls.address = Address.objects.create(
+            user=cls.user, full_name="Buyer", phone="9999999999", address_line="1 Main St",
+            city="Kochi", state="Kerala", postal_code="682001",
+        )
+
+    def make_products(self, count, stock=10, start=0):
+        return [
+            Product.objects.create(
+                category=self.category, name=f"Book {i}", slug=f"book-{i}", price=100 + i, stock=stock
+            )
+            for i in range(start, start + count)
+        ]
+
+    def fill_cart(self, products, quantity=1):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=p, quantity=quantity) for p in products])
+        return cart
+
+    def start_checkout(self):
+        self.client.force_login(self.user)
+        session = self.client.session
+        session["checkout_address"] = self.address.id
+        session["checkout_payment"] = "COD"
+        session.save()
+
+    def place_order(self):
+        self.start_checkout()
+        return self.client.get(reverse("place_order"))
+
+
+class PlaceOrderTests(OrderTestMixin, TestCase):
+
+    def test_creates_order_and_decrements_stock(self):
+        products = self.make_products(3)
+        self.fill_cart(products, quantity=2)
+
+        response = self.place_order()
+        order = Order.objects.get()
+        self.assertRedirects(response, reverse("order_success", args=[order.id]), fetch_redirect_response=False)
+        self.assertEqual(order.total_amount, (100 + 101 + 102) * 2)
+        self.assertEqual(order.items.count(), 3)
+        self.assertEqual(sorted(Product.objects.values_list("stock", flat=True)), [8, 8, 8])
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_insufficient_stock_rolls_back(self):
+        products = self.make_products(2)
+        Product.objects.filter(pk=products[1].pk).update(stock=1)
+        self.fill_cart(products, quantity=2)
+
+        response = self.place_order()
+        self.assertRedirects(response, reverse("view_cart"), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual(sorted(Product.objects.values_list("stock", flat=True)), [1, 10])
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        def count(products):
+            Order.objects.all().delete()
+            self.fill_cart(products)
+            self.start_checkout()
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(reverse("place_order"))
+            self.assertTrue(Order.objects.exists())
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count(self.make_products(1)), count(self.make_products(20, start=1)))
+
+
+class StockReservationTests(OrderTestMixin, TestCase):
+
+    def checkout(self, user, address):
+        self.client.force_login(user)
+        return self.client.post(reverse("checkout"), {"address": address.id, "payment_method": "COD"})
+
+    def test_checkout_holds_stock_against_other_buyers(self):
+        product = self.make_products(1, stock=1)[0]
+        self.fill_cart([product])
+        self.checkout(self.user, self.address)
+        product.refresh_from_db()
+        self.assertEqual((product.stock, product.reserved), (1, 1))
+
+        rival = User.objects.create_user("rival")
+        rival_address = Address.objects.create(
+            user=rival, full_name="Rival", phone="8888888888", address_line="2 Main St",
+            city="Kochi", state="Kerala", postal_code="682001",
+        )
+        Cart.objects.create(user=rival).items.create(product=product)
+        response = self.checkout(rival, rival_address)
+        self.assertRedirects(response, reverse("view_cart"), fetch_redirect_response=False)
+        self.assertEqual(StockReservation.objects.get().user, self.user)
+
+    def test_sweep_racing_a_conversion_gives_units_back_once(self):
+        product = self.make_products(1)[0]
+        holds = {}
+        for name, quantity in (("expired", 2), ("converting", 3), ("live", 4)):
+            user = User.objects.create_user(name)
+            holds[name] = StockReservation.objects.hold(user, {product.id: quantity})[0]
+        sweep = StockReservation.objects.filter(id__in=[holds["expired"].id, holds["converting"].id])
+
+        # place_order converts one of the swept holds just before the
+        # sweeper's DELETE reaches the database
+        converted = []
+
+        def convert_first(execute, sql, params, many, context):
+            if not converted and sql.startswith("DELETE"):
+                converted.append(True)
+                StockReservation.objects.filter(id=holds["converting"].id).release()
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(convert_first):
+            released = sweep.release()
+
+        self.assertEqual(released, {product.id: 2})
+        product.refresh_from_db()
+        self.assertEqual(product.reserved, 4)
+
+    def test_repeat_checkout_replaces_holds(self):
+        product = self.make_products(1)[0]
+        self.fill_cart([product], quantity=3)
+        self.checkout(self.user, self.address)
+        self.checkout(self.user, self.address)
+        product.refresh_from_db()
+        self.assertEqual(product.reserved, 3)
+        self.assertEqual(StockReservation.objects.count(), 1)
+
+    def test_place_order_converts_holds(self):
+        product = self.make_products(1, stock=2)[0]
+        self.fill_cart([product], quantity=2)
+        self.checkout(self.user, self.address)
+        self.place_order()
+        product.refresh_from_db()
+        self.assertEqual((product.stock, product.reserved), (0, 0))
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertTrue(Order.objects.exists())
+
+    def test_sweeper_releases_only_expired_holds(self):
+        products = self.make_products(2)
+        StockReservation.objects.hold(self.user, {products[0].id: 2})
+        other = User.objects.create_user("other")
+        StockReservation.objects.hold(other, {products[1].id: 3})
+        StockReservation.objects.filter(user=self.user).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        call_command("release_reservations", stdout=StringIO())
+        self.assertEqual(dict(Product.objects.values_list("id", "reserved")), {products[0].id: 0, products[1].id: 3})
+        self.assertEqual(StockReservation.objects.get().user, other)
+
+    def test_recount_repairs_drift(self):
+        product = self.make_products(1)[0]
+        StockReservation.objects.hold(self.user, {product.id: 2})
+        Product.objects.update(reserved=7)
+        call_command("release_reservations", "--recount", stdout=StringIO())
+        product.refresh_from_db()
+        self.assertEqual(product.reserved, 2)
+
+
+class CancelOrderTests(OrderTestMixin, TestCase):
+
+    def order(self, products, quantity=1):
+        self.fill_cart(products, quantity=quantity)
+        self.place_order()
+        return Order.objects.latest("id")
+
+    def test_cancel_restores_stock_and_updates_shipment(self):
+        products = self.make_products(2)
+        order = self.order(products, quantity=3)
+        Product.objects.filter(pk=products[0].pk).update(stock=F("stock") - 1)  # a sale elsewhere meanwhile
+
+        response = self.client.get(reverse("cancel_order", args=[order.id]))
+        self.assertRedirects(response, reverse("order_detail", args=[order.id]), fetch_redirect_response=False)
+        order.refresh_from_db()
+        self.assertEqual(order.status, "CANCELLED")
+        self.assertEqual(order.shipment.status, "Order Cancelled")
+        self.assertEqual(order.payment.status, "Completed")  # COD isn't refunded
+        self.assertEqual(dict(Product.objects.values_list("id", "stock")), {products[0].id: 9, products[1].id: 10})
+
+        # A second cancel is refused and doesn't restock again
+        self.client.get(reverse("cancel_order", args=[order.id]))
+        self.assertEqual(Product.objects.get(pk=products[1].pk).stock, 10)
+
+    def test_cancel_query_count_does_not_grow_with_lines(self):
+        def count(products):
+            order = self.order(products)
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(reverse("cancel_order", args=[order.id]))
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count(self.make_products(1)), count(self.make_products(15, start=1)))
+
+    def test_other_users_order_is_404(self):
+        order = self.order(self.make_products(1))
+        self.client.force_login(User.objects.create_user("other"))
+        self.assertEqual(self.client.get(reverse("cancel_order", args=[order.id])).status_code, 404)
+
+    def test_admin_bulk_cancel(self):
+        products = self.make_products(2)
+        first = self.order(products[:1], quantity=2)
+        second = self.order(products, quantity=1)
+        delivered = self.order(products[1:])
+        Order.objects.filter(pk=delivered.pk).update(status="DELIVERED")
+
+        admin = User.objects.create_superuser("admin", password="pass12345")
+        self.client.force_login(admin)
+        self.client.post(reverse("admin:orders_order_changelist"), {
+            "action": "cancel_orders",
+            "_selected_action": [first.id, second.id, delivered.id],
+        })
+        self.assertEqual(
+            dict(Order.objects.values_list("id", "status")),
+            {first.id: "CANCELLED", second.id: "CANCELLED", delivered.id: "DELIVERED"},
+        )
+        self.assertEqual(dict(Product.objects.values_list("id", "stock")), {products[0].id: 10, products[1].id: 9})
+
+
+class MyOrdersTests(OrderTestMixin, TestCase):
+
+    def test_orders_are_paginated_and_summarized(self):
+        products = self.make_products(2, stock=100)
+        ProductImage.objects.create(product=products[0], image="product_images/0.jpg")
+        ProductImage.objects.create(product=products[0], image="product_images/0-featured.jpg", is_featured=True)
+        for _ in range(ORDERS_PER_PAGE + 2):
+            self.fill_cart(products)
+            self.place_order()
+
+        response = self.client.get(reverse("my_orders"))
+        page = response.context["page"]
+        self.assertEqual(len(page), ORDERS_PER_PAGE)
+        self.assertTrue(page.has_next)
+        self.assertEqual([o.id for o in page], list(Order.objects.order_by("-id").values_list("id", flat=True)[:ORDERS_PER_PAGE]))
+        self.assertEqual(page.object_list[0].item_count, 2)
+        self.assertEqual(page.object_list[0].thumbnail, "product_images/0-featured.jpg")
+
+        response = self.client.get(reverse("my_orders"), {"cursor": page.next_cursor})
+        self.assertEqual(len(response.context["page"]), 2)
+
+    def test_query_count_does_not_grow_with_orders(self):
+        products = self.make_products(3)
+
+        def count():
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(reverse("my_orders"))
+            return len(ctx.captured_queries)
+
+        self.fill_cart(products)
+        self.place_order()
+        one = count()
+        for _ in range(5):
+            self.fill_cart(products)
+            self.place_order()
+        self.assertEqual(count(), one)
+
+
+class OrderDetailTests(OrderTestMixin, TestCase):
+
+    def test_query_count_does_not_grow_with_lines(self):
+        def count(products):
+            for product in products:
+                ProductImage.objects.create(product=product, image=f"product_images/{product.id}.jpg")
+            self.fill_cart(products)
+            self.place_order()
+            order = Order.objects.latest("id")
+            Order.objects.filter(pk=order.pk).update(status="DELIVERED")
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse("order_detail", args=[order.id]))
+            self.assertContains(response, f"product_images/{products[-1].id}.jpg")
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count(self.make_products(1)), count(self.make_products(12, start=1)))
+
+
+class InvoiceTests(OrderTestMixin, TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.invoices = os.path.join(media.name, "invoices")
+
+    def order(self, count=2):
+        self.fill_cart(self.make_products(count, start=Product.objects.count()))
+        self.place_order()
+        return Order.objects.latest("id")
+
+    def download(self, order, **headers):
+        return self.client.get(reverse("download_invoice", args=[order.id]), headers=headers)
+
+    def test_invoice_is_rendered_once_and_revalidated_by_etag(self):
+        order = self.order()
+        response = self.download(order)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+        etag = response["ETag"]
+        self.assertEqual(os.listdir(os.path.join(self.invoices, str(order.id))), [etag.strip('"') + ".pdf"])
+
+        self.assertEqual(self.download(order, if_none_match=etag).status_code, 304)
+
+        with mock.patch("orders.views.write_invoice") as write:
+            self.assertEqual(self.download(order).status_code, 200)
+        write.assert_not_called()
+
+    def test_changed_order_gets_a_new_invoice(self):
+        order = self.order()
+        etag = self.download(order)["ETag"]
+        Payment.objects.filter(order=order).update(status="Refunded")
+
+        response = self.download(order, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(os.listdir(os.path.join(self.invoices, str(order.id)))), 1)
+
+    def test_invoice_prerender_follows_setting(self):
+        with mock.patch("orders.views.generate_invoice_async") as generate:
+            with self.captureOnCommitCallbacks(execute=True):
+                order = self.order()
+        generate.assert_called_once_with(order.id)
+
+        with override_settings(INVOICE_PRERENDER=False), mock.patch("orders.views.generate_invoice_async") as generate:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.order()
+        generate.assert_not_called()
+
+    def test_invoice_swept_before_download_is_rendered_again(self):
+        order = self.order()
+        etag = self.download(order)["ETag"]
+        os.unlink(os.path.join(self.invoices, str(order.id), etag.strip('"') + ".pdf"))
+
+        response = self.download(order)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], etag)
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+
+    def test_long_orders_run_onto_more_pages(self):
+        order = Order.objects.for_invoice().get(pk=self.order(count=40).pk)
+        path, _digest = get_invoice(order)
+        with open(path, "rb") as fp:
+            self.assertGreater(fp.read().count(b"/Type /Page\n"), 1)
+
+    def test_admin_exports_selected_invoices_as_zip(self):
+        orders = [self.order(count=1) for _ in range(3)]
+        get_invoice(Order.objects.for_invoice().get(pk=orders[0].pk))  # one already cached
+
+        self.client.force_login(User.objects.create_superuser("admin", password="pass12345"))
+        response = self.client.post(reverse("admin:orders_order_changelist"), {
+            "action": "export_invoices",
+            "_selected_action": [order.id for order in orders],
+        })
+        self.assertEqual(response["Content-Type"], "application/zip")
+        archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), [f"Invoice_{order.id}.pdf" for order in orders])
+        self.assertTrue(all(archive.read(name).startswith(b"%PDF") for name in archive.namelist()))
+        self.assertEqual(len(os.listdir(self.invoices)), 3)
+
+
+class TrackOrderTests(OrderTestMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.fill_cart(self.make_products(1))
+        self.place_order()
+        self.client.logout()
+        self.shipment = Shipment.objects.get()
+        self.url = reverse("track_order", args=[self.shipment.tracking_no])
+
+    def test_json_is_cached_and_revalidated(self):
+        response = self.client.get(self.url, headers={"accept": "application/json"})
+        self.assertEqual(response.json()["status"], "Preparing for dispatch")
+        self.assertIn("public", response["Cache-Control"])
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {"format": "json"}, headers={"if_none_match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_html_is_never_answered_with_304(self):
+        # The page shows the visitor's login state and cart badge, which
+        # the tracking data doesn't cover, so it's rendered every time
+        response = self.client.get(self.url)
+        self.assertNotIn("ETag", response)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+        self.client.force_login(self.user)
+        self.fill_cart(self.make_products(1, start=Product.objects.count()))
+        cache.clear()
+        response = self.client.get(self.url, headers={"if_none_match": "*"})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'class="cart-count"')
+        self.assertContains(response, self.shipment.tracking_no)
+
+    def test_status_change_invalidates(self):
+        etag = self.client.get(self.url, {"format": "json"})["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shipment.status = "SHIPPED"
+            self.shipment.save(update_fields=["status"])
+
+        response = self.client.get(self.url, {"format": "json"}, headers={"if_none_match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "SHIPPED")
+
+    def test_cancel_invalidates(self):
+        self.client.get(self.url, {"format": "json"})
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.all().cancel()
+        self.assertEqual(self.client.get(self.url, {"format": "json"}).json()["status"], "Order Cancelled")
+
+    def test_unknown_tracking_number_is_404(self):
+        self.assertEqual(self.client.get(reverse("track_order", args=["NOPE"])).status_code, 404)
+
+
+@override_settings(COURIER_WEBHOOK_TOKEN="courier-secret")
+class ShipmentEventIngestTests(OrderTestMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        for _ in range(2):
+            self.fill_cart(self.make_products(1, start=Product.objects.count()))
+            self.place_order()
+        self.first, self.second = Shipment.objects.order_by("id")
+
+    def post(self, body, content_type="application/x-ndjson", token="courier-secret"):
+        return self.client.post(
+            reverse("shipment_events"), body, content_type=content_type,
+            headers={"authorization": f"Bearer {token}"},
+        )
+
+    def test_jsonl_batch_logs_events_and_moves_to_latest_status(self):
+        lines = [
+            {"tracking_no": self.first.tracking_no, "status": "SHIPPED", "occurred_at": "2026-01-02T10:00:00Z"},
+            {"tracking_no": self.first.tracking_no, "status": "DELIVERED", "occurred_at": "2026-01-04T10:00:00Z"},
+            # Arrives late but happened earlier: logged, doesn't move the status back
+            {"tracking_no": self.first.tracking_no, "status": "OUT_FOR_DELIVERY", "occurred_at": "2026-01-03T10:00:00Z"},
+            {"tracking_no": "NOPE", "status": "SHIPPED", "occurred_at": "2026-01-02T10:00:00Z"},
+            {"tracking_no": self.second.tracking_no, "status": "LOST", "occurred_at": "2026-01-02T10:00:00Z"},
+        ]
+        body = "\n".join(json.dumps(line) for line in lines) + "\nnot json\n"
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post(body)
+        self.assertEqual(response.json(), {"created": 3, "duplicate": 0, "updated": 1, "unknown": 1, "invalid": 2})
+
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.status, "DELIVERED")
+        self.assertEqual(self.first.shipped_date.day, 2)
+        self.assertEqual(self.first.delivery_date.day, 4)
+        self.assertEqual(self.first.events.count(), 3)
+
+        # A later batch with an older event leaves the status alone
+        self.post(json.dumps(
+            {"tracking_no": self.first.tracking_no, "status": "PROCESSING", "occurred_at": "2026-01-01T10:00:00Z"}
+        ))
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.status, "DELIVERED")
+
+    def test_malformed_rows_are_invalid_and_retries_append_nothing(self):
+        good = {"tracking_no": self.first.tracking_no, "status": "SHIPPED", "occurred_at": "2026-01-02T10:00:00Z"}
+        bad = [
+            {**good, "tracking_no": ["list"]},
+            {**good, "status": {"a": 1}},
+            {**good, "occurred_at": 1767348000},
+            {**good, "location": 42},
+        ]
+        body = (
+            "\n".join(json.dumps(line) for line in [good, *bad]).encode()
+            + b'\n{"tracking_no": "\xff\xfe"}\n'
+        )
+        response = self.post(body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"created": 1, "duplicate": 0, "updated": 1, "unknown": 0, "invalid": 5})
+
+        # The courier retries the whole batch
+        self.assertEqual(self.post(body).json()["duplicate"], 1)
+        self.assertEqual(self.first.events.count(), 1)
+
+    def test_csv_batch_and_tracking_cache(self):
+        url = reverse("track_order", args=[self.second.tracking_no])
+        self.assertEqual(self.client.get(url, {"format": "json"}).json()["status"], "Preparing for dispatch")
+
+        body = (
+            "tracking_no,status,occurred_at,location\n"
+            f"{self.second.tracking_no},SHIPPED,2026-01-02 10:00:00,Kochi Hub\n"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post(body, content_type="text/csv")
+        self.assertEqual(response.json()["created"], 1)
+        self.assertEqual(self.second.events.get().location, "Kochi Hub")
+        self.assertEqual(self.client.get(url, {"format": "json"}).json()["status"], "SHIPPED")
+
+    def test_requires_token_and_known_format(self):
+        self.assertEqual(self.post("", token="wrong").status_code, 403)
+        self.assertEqual(self.post("", content_type="text/plain").status_code, 415)
 
-# Create your tests here.
+    def test_command_ingests_file(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as fp:
+            fp.write(f"tracking_no,status,occurred_at\n{self.first.tracking_no},PROCESSING,2026-01-02T10:00:00\n")
+        self.addCleanup(os.unlink, fp.name)
+        out = StringIO()
+        call_command("ingest_shipment_events", fp.name, stdout=out)
+        self.assertIn("1 events logged", out.getvalue())
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.status, "PROCESSING")
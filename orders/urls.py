@@ -11,6 +11,7 @@ urlpatterns = [
     path('payment/', views.payment_page, name="payment_page"),
     path('place-order/', views.place_order, name="place_order"),
     path("track/<str:tracking_id>/", views.track_order, name="track_order"),
+    path('shipments/events/', views.shipment_events, name='shipment_events'),
     path('order/<int:order_id>/cancel/', views.cancel_order, name="cancel_order"),
     path('order/<int:order_id>/invoice/', views.download_invoice, name='download_invoice'),
     path('order/<int:order_id>/return/', views.return_order, name='return_order'),
@@ -3,16 +3,32 @@ from django.contrib.auth.decorators import login_required
 from django.utils.crypto import get_random_string
 from django.db import transaction
 from django.contrib import messages
-
-from reportlab.pdfgen import canvas
-from django.http import HttpResponse
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
+from django.conf import settings
+from django.http import FileResponse, Http404, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
 from cart.models import Cart
+from cart.caching import invalidate_cart_count
 from accounts.models import Address
+from store.models import OutOfStock, Product, StockReservation
+from store.pagination import KeysetPaginator
+from .caching import TRACKING_CACHE_TIMEOUT, get_tracking
+from .ingest import ingest_stream
+from .invoices import generate_invoice_async, invoice_data, invoice_digest, invoice_path, write_invoice
 from .models import Order, OrderItem, Payment, Shipment
 
+ORDERS_PER_PAGE = 10
+
+EVENT_FORMATS = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+    'application/json': 'jsonl',
+}
+
 
 
 
@@ -23,11 +39,12 @@ from .models import Order, OrderItem, Payment, Shipment
 def checkout(request):
     user = request.user
     cart = get_object_or_404(Cart, user=user)
-    items = cart.items.all()
-    total = cart.get_total()
+    summary = cart.summary
+    items = summary.lines
+    total = summary.total
     addresses = Address.objects.filter(user=user)
 
-    if not items.exists():
+    if not items:
         return redirect("view_cart")
 
     if request.method == "POST":
@@ -38,6 +55,13 @@ def checkout(request):
             messages.error(request, "Please select an address.")
             return redirect("checkout")
 
+        # Hold the stock until the order is placed or the hold expires
+        try:
+            StockReservation.objects.hold(user, {item.product_id: item.quantity for item in items})
+        except OutOfStock as e:
+            messages.error(request, f"Sorry, not enough stock for: {', '.join(e.products)}")
+            return redirect("view_cart")
+
         # Save temporary session values
         request.session["checkout_address"] = address_id
         request.session["checkout_payment"] = payment_method
@@ -72,7 +96,7 @@ def payment_page(request):
         return redirect("place_order")
 
     cart = get_object_or_404(Cart, user=request.user)
-    amount = cart.get_total()   # correct amount, NOT paisa
+    amount = cart.summary.total   # correct amount, NOT paisa
 
     if request.method == "POST":
         # Fake payment ID
@@ -99,9 +123,9 @@ def payment_page(request):
 def place_order(request):
     user = request.user
     cart = get_object_or_404(Cart, user=user)
-    items = cart.items.all()
+    quantities = dict(cart.items.values_list('product_id', 'quantity'))
 
-    if not items.exists():
+    if not quantities:
         return redirect("view_cart")
 
     address_id = request.session.get("checkout_address")
@@ -111,58 +135,87 @@ def place_order(request):
         return redirect("checkout")
 
     address = get_object_or_404(Address, id=address_id, user=user)
-    total = cart.get_total()
-
-    with transaction.atomic():
-
-        # 1. Payment entry
-        fake_pid = request.session.get("dummy_payment_id", "PAY_OFFLINE")
-        payment = Payment.objects.create(
-            user=user,
-            method=payment_method,
-            amount=total,
-            payment_id=fake_pid,
-            status="Completed"
-        )
-
-        # 2. Order entry WITH SHIPPING SNAPSHOT
-        order = Order.objects.create(
-            user=user,
-            address=address,
-            payment=payment,
-            total_amount=total,
-            status="PENDING",
-
-            # 📌 SNAPSHOT: Store address details at the time of order
-            shipping_full_name=address.full_name,
-            shipping_phone=address.phone,
-            shipping_address=address.full_address(),
-        )
-
-        # 3. Order items
-        for item in items:
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                quantity=item.quantity,
-                price=item.product.price,
+
+    try:
+        with transaction.atomic():
+
+            # 1. Convert this buyer's holds back into free stock, lock the
+            #    products in id order (so concurrent checkouts can't deadlock),
+            #    validate stock and take it off in one UPDATE
+            StockReservation.objects.filter(user=user).release()
+            products = {
+                product.id: product
+                for product in Product.objects.select_for_update()
+                .filter(id__in=quantities).order_by('id').only('id', 'name', 'price', 'stock', 'reserved')
+            }
+            short = [p.name for p in products.values() if p.available_stock < quantities[p.id]]
+            if short or len(products) != len(quantities):
+                raise OutOfStock(short)
+            Product.objects.decrement_stock(quantities)
+
+            # Price the order from the locked rows
+            total = sum(products[pid].price * qty for pid, qty in quantities.items())
+
+            # 2. Payment entry
+            fake_pid = request.session.get("dummy_payment_id", "PAY_OFFLINE")
+            payment = Payment.objects.create(
+                user=user,
+                method=payment_method,
+                amount=total,
+                payment_id=fake_pid,
+                status="Completed"
+            )
+
+            # 3. Order entry WITH SHIPPING SNAPSHOT
+            order = Order.objects.create(
+                user=user,
+                address=address,
+                payment=payment,
+                total_amount=total,
+                status="PENDING",
+
+                # 📌 SNAPSHOT: Store address details at the time of order
+                shipping_full_name=address.full_name,
+                shipping_phone=address.phone,
+                shipping_address=address.full_address(),
             )
 
-        # 4. Shipment
-        Shipment.objects.create(
-            order=order,
-            tracking_no="BB" + get_random_string(8).upper(),
-            courier_name="BuyBuddy Express",
-            status="Preparing for dispatch"
-        )
+            # 4. Order items in one INSERT
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product_id=product_id,
+                    quantity=quantity,
+                    price=products[product_id].price,
+                )
+                for product_id, quantity in quantities.items()
+            ])
+
+            # 5. Shipment
+            Shipment.objects.create(
+                order=order,
+                tracking_no="BB" + get_random_string(8).upper(),
+                courier_name="BuyBuddy Express",
+                status="Preparing for dispatch"
+            )
 
-        # 5. Clear cart
-        items.delete()
+            # 6. Clear cart
+            cart.items.all().delete()
+            transaction.on_commit(lambda: invalidate_cart_count(user.id))
+            if settings.INVOICE_PRERENDER:
+                transaction.on_commit(lambda: generate_invoice_async(order.id))
+
+    except OutOfStock as e:
+        if e.products:
+            messages.error(request, f"Sorry, not enough stock for: {', '.join(e.products)}")
+        else:
+            messages.error(request, "Some items in your cart are no longer available.")
+        return redirect("view_cart")
 
-        # 6. Clear sessions
-        request.session.pop("checkout_address", None)
-        request.session.pop("checkout_payment", None)
-        request.session.pop("dummy_payment_id", None)
+    # 7. Clear sessions
+    request.session.pop("checkout_address", None)
+    request.session.pop("checkout_payment", None)
+    request.session.pop("dummy_payment_id", None)
 
     return redirect("order_success", order_id=order.id)
 
@@ -182,33 +235,15 @@ def order_success(request, order_id):
 # ---------------------------------------------------------
 @login_required
 def cancel_order(request, order_id):
-    order = get_object_or_404(Order, id=order_id, user=request.user)
+    orders = Order.objects.filter(id=order_id, user=request.user)
 
-    # Prevent cancelling delivered or already cancelled
-    if order.status in ["DELIVERED", "CANCELLED"]:
+    # Delivered or already cancelled orders are skipped by cancel()
+    if not orders.cancel():
+        if not orders.exists():
+            raise Http404("No Order matches the given query.")
         messages.error(request, "This order cannot be cancelled.")
         return redirect("order_detail", order_id=order_id)
 
-    with transaction.atomic():
-        # 1. Update order status
-        order.status = "CANCELLED"
-        order.save()
-
-        # 2. Refund for online payments
-        if order.payment.method != "COD":
-            order.payment.status = "Refunded"
-            order.payment.save()
-
-        # 3. Restore product stock (optional)
-        for item in order.items.all():
-            product = item.product
-            product.stock += item.quantity
-            product.save()
-
-        # 4. Update shipment
-        order.shipment.status = "Order Cancelled"
-        order.shipment.save()
-
     messages.success(request, "Your order has been cancelled.")
     return redirect("order_detail", order_id=order_id)
 
@@ -219,8 +254,11 @@ def cancel_order(request, order_id):
 # ---------------------------------------------------------
 @login_required
 def my_orders(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'orders/my_orders.html', {'orders': orders})
+    orders = Order.objects.filter(user=request.user).with_summary()
+    page = KeysetPaginator(orders, ('-created_at', '-id'), per_page=ORDERS_PER_PAGE).get_page(
+        request.GET.get('cursor')
+    )
+    return render(request, 'orders/my_orders.html', {'orders': page, 'page': page})
 
 
 # ---------------------------------------------------------
@@ -228,7 +266,7 @@ def my_orders(request):
 # ---------------------------------------------------------
 @login_required
 def order_detail(request, order_id):
-    order = get_object_or_404(Order, id=order_id, user=request.user)
+    order = get_object_or_404(Order.objects.for_detail(), id=order_id, user=request.user)
 
     tracking_stages = ['PLACED', 'PROCESSING', 'SHIPPED', 'OUT_FOR_DELIVERY', 'DELIVERED']
 
@@ -244,49 +282,30 @@ def order_detail(request, order_id):
 # ---------------------------------------------------------
 @login_required
 def download_invoice(request, order_id):
-    order = get_object_or_404(Order, id=order_id, user=request.user)
-
-    # File response
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="Invoice_{order.id}.pdf"'
-
-    p = canvas.Canvas(response, pagesize=letter)
-    width, height = letter
-
-    # Header
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(30, height - 50, "BUYBUDDY - OFFICIAL INVOICE")
-
-    p.setFont("Helvetica", 12)
-    p.drawString(30, height - 90, f"Invoice No: BB-INV-{order.id}")
-    p.drawString(30, height - 110, f"Order Date: {order.created_at.strftime('%Y-%m-%d')}")
-    p.drawString(30, height - 130, f"Customer: {order.user.username}")
-    p.drawString(30, height - 150, f"Payment Method: {order.payment.method}")
-    p.drawString(30, height - 170, f"Payment Status: {order.payment.status}")
-
-    # Address
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(30, height - 210, "Shipping Address:")
-    p.setFont("Helvetica", 12)
-    p.drawString(30, height - 230, order.address.full_address())
-
-    # Items table
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(30, height - 270, "Order Items:")
-
-    y = height - 300
-    p.setFont("Helvetica", 12)
-
-    for item in order.items.all():
-        p.drawString(30, y, f"{item.product.name} (x{item.quantity}) - Rs {item.price}")
-        y -= 20
-
-    # Total
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(30, y - 20, f"Total Amount: Rs {order.total_amount}")
-
-    p.showPage()
-    p.save()
+    order = get_object_or_404(Order.objects.for_invoice(), id=order_id, user=request.user)
+
+    # The content hash is cheap to compute and doubles as the ETag, so a
+    # repeat download is answered before touching the file
+    data = invoice_data(order)
+    digest = invoice_digest(data)
+    etag = f'"{digest}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    # Normally already rendered in the background after place_order. Open
+    # rather than test for the file first: a render for a newer version of
+    # the order may sweep it away at any moment
+    path = invoice_path(order.id, digest)
+    try:
+        fp = open(path, 'rb')
+    except FileNotFoundError:
+        write_invoice(data, path)
+        fp = open(path, 'rb')
+
+    response = FileResponse(fp, as_attachment=True, filename=f"Invoice_{order.id}.pdf", content_type='application/pdf')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
     return response
 
 
@@ -324,13 +343,48 @@ def return_order(request, order_id):
     })
 
 
+# Public: customers and courier webhooks poll this, so it's served from
+# the cache with an ETag and makes no queries when warm
 def track_order(request, tracking_id):
-    shipment = get_object_or_404(Shipment, tracking_no=tracking_id)
-    order = shipment.order
+    tracking = get_tracking(tracking_id)
+    if tracking is None:
+        raise Http404("No Shipment matches the given query.")
+
+    as_json = (
+        request.GET.get('format') == 'json'
+        or request.get_preferred_type(['text/html', 'application/json']) == 'application/json'
+    )
+    if as_json:
+        # Nothing user-specific in the JSON, so it can be revalidated by
+        # ETag and shared caches may keep it briefly
+        etag = f'"{tracking["etag"]}-json"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = JsonResponse({k: v for k, v in tracking.items() if k != 'etag'})
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=TRACKING_CACHE_TIMEOUT)
+    else:
+        # The page carries the visitor's header and cart badge, which the
+        # tracking ETag knows nothing about, so it's always rendered
+        response = render(request, "orders/track_order.html", {"tracking": tracking})
+        patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Accept'])
+    return response
 
-    return render(request, "orders/track_order.html", {
-        "order": order,
-        "shipment": shipment
-    })
 
+# Courier webhook: a batch of status events as JSON lines or CSV, read
+# line by line so large batches aren't buffered in memory
+@csrf_exempt
+@require_POST
+def shipment_events(request):
+    token = settings.COURIER_WEBHOOK_TOKEN
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not token or not constant_time_compare(supplied, token):
+        return JsonResponse({'error': 'Invalid courier token.'}, status=403)
+
+    fmt = EVENT_FORMATS.get(request.content_type)
+    if fmt is None:
+        return JsonResponse({'error': 'Send text/csv or application/x-ndjson.'}, status=415)
 
+    result = ingest_stream(request, fmt)
+    return JsonResponse(result.as_dict())
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Brand, Product, ProductImage
+from .models import Category, Brand, Product, ProductImage, StockReservation
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -16,8 +16,35 @@ class ProductImageInline(admin.TabularInline):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'category', 'brand', 'price', 'stock', 'is_available')
+    list_display = ('name', 'category', 'brand', 'price', 'stock', 'reserved', 'is_available')
     list_filter = ('category', 'brand', 'is_available')
     search_fields = ('name', 'description')
     prepopulated_fields = {'slug': ('name',)}
     inlines = [ProductImageInline]
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # Write back only what the form edits: counters such as reserved are
+        # moved by concurrent F() updates, and the values loaded when the
+        # form opened would overwrite them
+        fields = [f.name for f in obj._meta.concrete_fields if f.editable and not f.primary_key]
+        obj.save(update_fields=fields + ['updated_at'])
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('product', 'user', 'quantity', 'expires_at')
+
+    # Holds mirror Product.reserved, so they're only created by checkout
+    # and deleting one has to hand its units back
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def delete_model(self, request, obj):
+        StockReservation.objects.filter(pk=obj.pk).release()
+
+    def delete_queryset(self, request, queryset):
+        queryset.release()
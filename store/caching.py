@@ -0,0 +1,183 @@
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from cart.guest import GUEST_CART_COOKIE
+
+PRODUCT_CACHE_TIMEOUT = 15 * 60
+
+
+def first_review_page_key(product_id):
+    return f'store:reviews:{product_id}:first'
+
+
+def invalidate_reviews(product_id):
+    cache.delete(first_review_page_key(product_id))
+
+
+def product_version_key(product_id):
+    return f'store:product-version:{product_id}'
+
+
+def product_version(product_id):
+    key = product_version_key(product_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_product_version(product_id):
+    """Invalidate every cached snapshot of a product in one write."""
+    cache.set(product_version_key(product_id), time.time_ns(), None)
+
+
+def get_product_snapshot(slug, loader):
+    """Return the anonymous-invariant part of a product page.
+
+    Snapshots are stored by slug and stamped with the product's version;
+    a stamp that no longer matches the current version is a miss. This
+    keeps the warm path at two cache reads and no queries, while any save
+    to the product, its images or its reviews invalidates every copy.
+    ``loader`` builds a fresh snapshot dict, or returns None for a 404.
+    """
+    key = f'store:product:{slug}'
+    snapshot = cache.get(key)
+    if snapshot is not None and snapshot['version'] == cache.get(product_version_key(snapshot['product'].id)):
+        return snapshot
+
+    snapshot = loader()
+    if snapshot is not None:
+        snapshot['version'] = product_version(snapshot['product'].id)
+        cache.set(key, snapshot, PRODUCT_CACHE_TIMEOUT)
+    return snapshot
+
+
+PRODUCT_CARD_TIMEOUT = 24 * 60 * 60
+
+
+def product_card_key(product):
+    """Fragment key for a listing card, from the values the card shows.
+
+    ``updated_at`` covers product saves and ``adjust_rating()``, which
+    stamps it too. The rating is added for ``rebuild_ratings``, whose
+    ``bulk_update()`` leaves ``updated_at`` alone, and the featured image
+    and category name because they live in other tables.
+    """
+    image = product.featured_image
+    parts = (
+        product.id,
+        product.updated_at.timestamp(),
+        product.rating_count,
+        product.rating_avg,
+        image.image.name if image else '',
+        product.category.name,
+    )
+    return 'store:card:' + hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def tag_version_key(tag):
+    return f'store:tag-version:{tag}'
+
+
+def tag_versions(tags):
+    """Current version of each tag, starting any that are missing."""
+    keys = [tag_version_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, time.time_ns(), None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def bump_tags(*tags):
+    """Invalidate every cached page carrying any of ``tags``."""
+    now = time.time_ns()
+    cache.set_many({tag_version_key(tag): now for tag in tags}, None)
+
+
+# Query parameters that never change what a catalog page shows
+IGNORED_PARAMS = ('utm_', 'fbclid', 'gclid')
+
+
+def page_cache_key(request):
+    params = sorted(
+        (name, value)
+        for name, values in request.GET.lists()
+        if not name.startswith(IGNORED_PARAMS)
+        for value in values if value
+    )
+    digest = hashlib.md5(f'{request.path}?{urlencode(params)}'.encode()).hexdigest()
+    return f'store:page:{digest}'
+
+
+def visitor_cookies():
+    """Cookies that carry per-visitor state a page renders (login, flash messages, cart badge)."""
+    return (settings.SESSION_COOKIE_NAME, CookieStorage.cookie_name, GUEST_CART_COOKIE)
+
+
+def is_anonymous_page_request(request):
+    # Decided from cookies alone: resolving request.user would load the
+    # session. Without any of these cookies there's no login, flash message
+    # or guest cart, so the page is the same for every such visitor.
+    return (
+        request.method in ('GET', 'HEAD')
+        and not any(name in request.COOKIES for name in visitor_cookies())
+    )
+
+
+def cache_anonymous_page(*tags):
+    """Serve the view's page from the cache to visitors without a session.
+
+    Pages are keyed on path and normalized query string and stamped with
+    the versions of ``tags``; ``bump_tags()`` (called from the model
+    signals) makes every page carrying a tag a miss. A hit needs two cache
+    reads and no queries. Off unless ``ANONYMOUS_PAGE_CACHE_TIMEOUT`` is set.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            timeout = settings.ANONYMOUS_PAGE_CACHE_TIMEOUT
+            if not timeout or not is_anonymous_page_request(request):
+                return view(request, *args, **kwargs)
+
+            key = page_cache_key(request)
+            entry = cache.get(key)
+            if entry is not None and entry['versions'] == cache.get_many(list(entry['versions'])):
+                response = HttpResponse(entry['content'], content_type=entry['content_type'])
+                patch_vary_headers(response, ['Cookie'])
+                return response
+
+            # Stamp with the versions from before rendering, so a save that
+            # lands mid-render leaves the stored page already stale
+            versions = tag_versions(tags)
+            response = view(request, *args, **kwargs)
+            # Anything that would hand this visitor a cookie (a CSRF token
+            # in the page, a new session) makes the page theirs alone
+            if (
+                request.method == 'GET'
+                and response.status_code == 200
+                and not response.streaming
+                and not response.cookies
+                and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+                and not request.session.modified
+            ):
+                cache.set(key, {
+                    'content': response.content,
+                    'content_type': response['Content-Type'],
+                    'versions': versions,
+                }, timeout)
+            patch_vary_headers(response, ['Cookie'])
+            return response
+        return wrapper
+    return decorator
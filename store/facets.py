@@ -0,0 +1,95 @@
+import hashlib
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+FACET_CACHE_TIMEOUT = 300
+
+# Same ranges as the price dropdown in base.html
+PRICE_BUCKETS = (
+    ('0-500', '₹0 - ₹500'),
+    ('500-1000', '₹500 - ₹1000'),
+    ('1000-2000', '₹1000 - ₹2000'),
+    ('2000-5000', '₹2000 - ₹5000'),
+)
+
+
+# Largest primary key the database column can hold (signed 64-bit)
+MAX_ID = 2 ** 63 - 1
+
+
+def parse_id(value):
+    """Return a positive int id, or None for missing or malformed input."""
+    # isdigit() alone lets through Unicode digits such as '²' that int() rejects
+    if not value or not value.isascii() or not value.isdigit():
+        return None
+    value = int(value)
+    return value if 0 < value <= MAX_ID else None
+
+
+def parse_price_range(value):
+    """Parse ``"min-max"`` into a pair of Decimals, or None if malformed."""
+    if not value:
+        return None
+    parts = value.split('-')
+    if len(parts) != 2:
+        return None
+    try:
+        low, high = Decimal(parts[0]), Decimal(parts[1])
+    except InvalidOperation:
+        return None
+    if not (low.is_finite() and high.is_finite()) or low < 0 or low > high:
+        return None
+    return low, high
+
+
+def normalize_query(query):
+    return ' '.join(re.findall(r'\w+', query.lower()))
+
+
+def price_q(price_range):
+    low, high = price_range
+    return Q(price__gte=low, price__lte=high)
+
+
+def facet_counts(products, query='', category=None, brand=None, price=None):
+    """Category, brand and price-bucket counts for a text-matched queryset.
+
+    ``products`` must already be narrowed by the text query but not by the
+    facet filters. Counts are disjunctive: each facet honours the other two
+    active filters but not its own, so every option shows how many results
+    picking it would give. Everything comes from one aggregate grouped by
+    (category, brand), with a conditional count per price bucket, and is
+    cached per normalized query and filter combination.
+    """
+    key_source = '|'.join([normalize_query(query), str(category), str(brand), str(price)])
+    key = 'store:facets:' + hashlib.md5(key_source.encode()).hexdigest()
+    facets = cache.get(key)
+    if facets is not None:
+        return facets
+
+    aggregates = {'total': Count('id')}
+    for i, (value, _label) in enumerate(PRICE_BUCKETS):
+        aggregates[f'bucket_{i}'] = Count('id', filter=price_q(parse_price_range(value)))
+    if price:
+        aggregates['in_price'] = Count('id', filter=price_q(price))
+
+    cells = products.order_by().values('category_id', 'brand_id').annotate(**aggregates)
+
+    facets = {'category': {}, 'brand': {}, 'price': {value: 0 for value, _label in PRICE_BUCKETS}}
+    for cell in cells:
+        in_price = cell['in_price'] if price else cell['total']
+        if in_price and (brand is None or cell['brand_id'] == brand):
+            counts = facets['category']
+            counts[cell['category_id']] = counts.get(cell['category_id'], 0) + in_price
+        if in_price and cell['brand_id'] is not None and (category is None or cell['category_id'] == category):
+            counts = facets['brand']
+            counts[cell['brand_id']] = counts.get(cell['brand_id'], 0) + in_price
+        if (category is None or cell['category_id'] == category) and (brand is None or cell['brand_id'] == brand):
+            for i, (value, _label) in enumerate(PRICE_BUCKETS):
+                facets['price'][value] += cell[f'bucket_{i}']
+
+    cache.set(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
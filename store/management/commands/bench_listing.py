@@ -0,0 +1,74 @@
+import time
+from statistics import median
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.models import Category, Product
+from store.pagination import KeysetPaginator
+from store.views import LISTING_ORDERING, PRODUCTS_PER_PAGE
+
+BENCH_PREFIX = "bench-listing-"
+
+
+class Command(BaseCommand):
+    help = "Seed a large catalog and measure keyset page latency at increasing depth"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100_000)
+        parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100, 500])
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded products")
+
+    def seed(self, count):
+        category, _ = Category.objects.get_or_create(
+            slug="bench-listing", defaults={"name": "Bench Listing"}
+        )
+        existing = Product.objects.filter(slug__startswith=BENCH_PREFIX).count()
+        batch = []
+        with transaction.atomic():
+            for i in range(existing, count):
+                batch.append(Product(
+                    category=category,
+                    name=f"Bench product {i}",
+                    slug=f"{BENCH_PREFIX}{i}",
+                    price=(i % 5000) + 1,
+                    stock=10,
+                ))
+                if len(batch) == 5000:
+                    Product.objects.bulk_create(batch)
+                    batch = []
+            Product.objects.bulk_create(batch)
+        return category
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"🟢 Seeding {options['products']} products...")
+        category = self.seed(options["products"])
+
+        queryset = Product.objects.available().for_listing().filter(category=category)
+        paginator = KeysetPaginator(queryset, LISTING_ORDERING, per_page=PRODUCTS_PER_PAGE)
+
+        # Walk the cursors once to find the cursor for each target page
+        targets = sorted(options["pages"])
+        cursors = {}
+        cursor, number = None, 1
+        while number <= targets[-1]:
+            if number in targets:
+                cursors[number] = cursor
+            page = paginator.get_page(cursor)
+            if not page.has_next:
+                break
+            cursor, number = page.next_cursor, number + 1
+
+        for number, cursor in cursors.items():
+            timings = []
+            for _ in range(options["repeat"]):
+                start = time.perf_counter()
+                list(paginator.get_page(cursor))
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(f"page {number:>5}: {median(timings):7.2f} ms (median of {options['repeat']})")
+
+        if not options["keep"]:
+            Product.objects.filter(slug__startswith=BENCH_PREFIX).delete()
+            category.delete()
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark finished"))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from store.models import Product, Review
+
+RATING_FIELDS = [
+    'rating_avg', 'rating_count', 'rating_total',
+    'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+]
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized product rating aggregates from reviews in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        stars = {f"rating_{i}_count": Count("id", filter=Q(rating=i)) for i in range(1, 6)}
+        updated = 0
+        last_id = 0
+
+        while True:
+            products = list(
+                Product.objects.filter(id__gt=last_id).order_by("id").only("id", *RATING_FIELDS)[:batch_size]
+            )
+            if not products:
+                break
+            last_id = products[-1].id
+
+            # One grouped aggregate per batch instead of one per product
+            rows = {
+                row.pop("product_id"): row
+                for row in Review.objects.filter(product__in=products)
+                .values("product_id")
+                .annotate(rating_count=Count("id"), rating_total=Sum("rating"), **stars)
+                .order_by()
+            }
+            for product in products:
+                row = rows.get(product.id, {})
+                for field in RATING_FIELDS[1:]:
+                    setattr(product, field, row.get(field) or 0)
+                product.rating_avg = product.rating_total / product.rating_count if product.rating_count else 0
+
+            with transaction.atomic():
+                Product.objects.bulk_update(products, RATING_FIELDS)
+            updated += len(products)
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Rebuilt ratings for {updated} products"))
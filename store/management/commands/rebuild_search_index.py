@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store.models import Product
+from store.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product search index, optionally only for recently changed products"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since-hours", type=float,
+            help="Only re-index products updated within the last N hours",
+        )
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.install()
+
+        product_ids = None
+        if options["since_hours"] is not None:
+            since = timezone.now() - timedelta(hours=options["since_hours"])
+            product_ids = (
+                Product.objects.filter(updated_at__gte=since)
+                .order_by("id").values_list("id", flat=True).iterator()
+            )
+
+        indexed = backend.rebuild(product_ids, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"✅ Indexed {indexed} products"))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from store.models import Product, StockReservation
+
+
+class Command(BaseCommand):
+    help = "Release expired stock reservations back to sale (run every minute or so)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--recount", action="store_true",
+            help="Also recompute Product.reserved from the live holds, to repair drift",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        released = 0
+
+        # Walk the expiry index in small batches so no transaction holds
+        # locks on many products at once
+        while True:
+            ids = list(
+                StockReservation.objects.expired(now).order_by("expires_at").values_list("id", flat=True)[
+                    :options["batch_size"]
+                ]
+            )
+            if not ids:
+                break
+            released += sum(StockReservation.objects.filter(id__in=ids).release().values())
+
+        if options["recount"]:
+            held = (
+                StockReservation.objects.filter(product=OuterRef("pk"))
+                .values("product")
+                .annotate(total=Sum("quantity"))
+                .values("total")
+            )
+            with transaction.atomic():
+                Product.objects.update(reserved=Coalesce(Subquery(held), Value(0)))
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Released {released} reserved units"))
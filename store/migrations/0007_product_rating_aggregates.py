@@ -0,0 +1,78 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:17
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_ratings(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Review = apps.get_model('store', 'Review')
+    stars = {f'rating_{i}_count': Count('id', filter=Q(rating=i)) for i in range(1, 6)}
+    rows = Review.objects.values('product_id').annotate(
+        rating_count=Count('id'), rating_total=Sum('rating'), **stars
+    )
+    for row in rows:
+        product_id = row.pop('product_id')
+        row['rating_avg'] = row['rating_total'] / row['rating_count']
+        Product.objects.filter(pk=product_id).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_product_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='rating',
+            field=models.PositiveIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-rating_avg', '-rating_count', '-id'], name='product_top_rated_idx'),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='reserved',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
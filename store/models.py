@@ -1,5 +1,11 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import connection, models, transaction
+from django.db.models import Case, F, FloatField, Prefetch, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, NullIf
 from django.contrib.auth.models import User
+from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 
 
 
@@ -29,6 +35,117 @@ class Brand(models.Model):
         return self.name
 
 
+class OutOfStock(Exception):
+    def __init__(self, products):
+        self.products = products
+        super().__init__(f"Not enough stock for: {', '.join(products)}")
+
+
+def featured_image_prefetch(lookup='images'):
+    """Prefetch one image per product (featured first) into ``listing_images``.
+
+    ``lookup`` is the path to the images relation, e.g. ``'product__images'``
+    when prefetching through another model.
+    """
+    featured = ProductImage.objects.order_by('-is_featured', 'id')
+    return Prefetch(lookup, queryset=featured[:1], to_attr='listing_images')
+
+
+def per_product(quantities):
+    """CASE expression mapping each product id in ``quantities`` to its quantity."""
+    return Case(
+        *[When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=models.PositiveIntegerField(),
+    )
+
+
+# Product QuerySet
+class ProductQuerySet(models.QuerySet):
+
+    def available(self):
+        return self.filter(is_available=True)
+
+    def for_listing(self):
+        """Everything a product card needs, in a fixed number of queries.
+
+        Category and brand are joined in, and exactly one image per product
+        (featured first, then the oldest upload) is prefetched into
+        ``listing_images`` so templates can use ``product.featured_image``.
+        """
+        return self.select_related('category', 'brand').prefetch_related(featured_image_prefetch())
+
+    def decrement_stock(self, quantities):
+        """Take ``{product_id: quantity}`` off stock in one conditional UPDATE.
+
+        Only rows whose unreserved stock still covers the quantity are
+        updated; if any product falls short, OutOfStock is raised so the
+        enclosing transaction rolls the partial update back. Release the
+        buyer's own holds first so they count as free stock.
+        """
+        needed = per_product(quantities)
+        updated = self.filter(
+            id__in=quantities, stock__gte=F('reserved') + needed
+        ).update(stock=F('stock') - needed)
+        if updated != len(quantities):
+            raise OutOfStock(self.short_of(quantities))
+        return updated
+
+    def restock(self, quantities):
+        """Put ``{product_id: quantity}`` back on stock in one F() UPDATE."""
+        if not quantities:
+            return 0
+        return self.filter(id__in=quantities).update(stock=F('stock') + per_product(quantities))
+
+    def reserve(self, quantities):
+        """Add ``{product_id: quantity}`` to ``reserved`` where enough is unreserved.
+
+        Same all-or-nothing contract as ``decrement_stock()``.
+        """
+        needed = per_product(quantities)
+        updated = self.filter(
+            id__in=quantities, stock__gte=F('reserved') + needed
+        ).update(reserved=F('reserved') + needed)
+        if updated != len(quantities):
+            raise OutOfStock(self.short_of(quantities))
+        return updated
+
+    def unreserve(self, quantities):
+        if not quantities:
+            return 0
+        return self.filter(id__in=quantities).update(
+            reserved=Greatest(F('reserved') - per_product(quantities), 0)
+        )
+
+    def short_of(self, quantities):
+        """Names of the products that can't supply ``quantities``."""
+        return list(self.filter(
+            id__in=quantities, stock__lt=F('reserved') + per_product(quantities)
+        ).values_list('name', flat=True))
+
+    def adjust_rating(self, added=None, removed=None):
+        """Apply one review's rating change to the denormalized aggregates.
+
+        Pass ``added`` for a new review, ``removed`` for a deleted one and
+        both for an edit. Runs as a single UPDATE using F() arithmetic, so
+        concurrent reviews never overwrite each other's counts.
+        """
+        count_delta = (added is not None) - (removed is not None)
+        total_delta = (added or 0) - (removed or 0)
+        new_count = F('rating_count') + count_delta
+        new_total = F('rating_total') + total_delta
+        changes = {
+            'rating_count': new_count,
+            'rating_total': new_total,
+            'rating_avg': Coalesce(Cast(new_total, FloatField()) / NullIf(new_count, 0), 0.0),
+            'updated_at': timezone.now(),
+        }
+        for star, delta in ((added, 1), (removed, -1)):
+            if star is not None:
+                field = f'rating_{star}_count'
+                changes[field] = changes.get(field, F(field)) + delta
+        return self.update(**changes)
+
+
 # Product Model
 class Product(models.Model):
     
@@ -43,9 +160,58 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized review aggregates, maintained by ProductQuerySet.adjust_rating()
+    # and rebuild_ratings; not editable, so forms can't write stale values back
+    rating_avg = models.FloatField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_total = models.PositiveIntegerField(default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Units held by live StockReservations; stock - reserved is what's for sale.
+    # Only ever changed by the reserve()/unreserve() UPDATEs, never by forms
+    reserved = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination: (created_at, id) for listings, (price, id) for sorted search
+            models.Index(fields=['-created_at', '-id'], name='product_recent_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='product_category_recent_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+            models.Index(fields=['-rating_avg', '-rating_count', '-id'], name='product_top_rated_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    @property
+    def rating_histogram(self):
+        """(star, count, percent) rows from 5 stars down to 1."""
+        rows = []
+        for star in range(5, 0, -1):
+            count = getattr(self, f'rating_{star}_count')
+            percent = round(count * 100 / self.rating_count) if self.rating_count else 0
+            rows.append((star, count, percent))
+        return rows
+
+    @property
+    def available_stock(self):
+        return max(self.stock - self.reserved, 0)
+
+    @property
+    def featured_image(self):
+        # Use the listing prefetch when present, otherwise fall back to a query
+        if hasattr(self, 'listing_images'):
+            images = self.listing_images
+        else:
+            images = self.images.order_by('-is_featured', 'id')[:1]
+        return images[0] if images else None
+
 
 # Product Image Model
 class ProductImage(models.Model):
@@ -65,7 +231,9 @@ class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
-    rating = models.PositiveIntegerField(default=1)
+    rating = models.PositiveIntegerField(
+        default=1, validators=[MinValueValidator(1), MaxValueValidator(5)]
+    )
     review = models.TextField()
     date = models.DateTimeField(auto_now_add=True)
 
@@ -75,3 +243,76 @@ class Review(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.product.name}"
 
+
+# Stock held for a buyer between checkout and payment
+RESERVATION_TTL = timedelta(minutes=15)
+
+
+class StockReservationQuerySet(models.QuerySet):
+
+    def expired(self, now=None):
+        return self.filter(expires_at__lte=now or timezone.now())
+
+    def hold(self, user, quantities):
+        """Replace ``user``'s holds with ``{product_id: quantity}``.
+
+        Raises OutOfStock, leaving the previous holds in place, if any
+        product hasn't enough unreserved stock.
+        """
+        expires_at = timezone.now() + RESERVATION_TTL
+        with transaction.atomic():
+            self.filter(user=user).release()
+            Product.objects.reserve(quantities)
+            return self.bulk_create([
+                StockReservation(user=user, product_id=product_id, quantity=quantity, expires_at=expires_at)
+                for product_id, quantity in quantities.items()
+            ])
+
+    def release(self):
+        """Delete these holds and hand their units back to ``Product.reserved``.
+
+        Returns ``{product_id: quantity}`` released. The units given back
+        are the ones the DELETE itself reports (``RETURNING``), not a
+        separate read, so a hold that place_order converts while the sweeper
+        runs is only given back once. SQLite has no row locks to close that
+        gap any other way.
+        """
+        table = StockReservation._meta.db_table
+        ids_sql, params = self.values('id').query.sql_with_params()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE id IN ({ids_sql}) RETURNING product_id, quantity", params
+                )
+                rows = cursor.fetchall()
+            released = {}
+            for product_id, quantity in rows:
+                released[product_id] = released.get(product_id, 0) + quantity
+            if released:
+                Product.objects.unreserve(released)
+        return released
+
+
+class StockReservation(models.Model):
+    """Units of a product held for one buyer until ``expires_at``.
+
+    Each hold is mirrored in ``Product.reserved`` so availability is a
+    column read rather than a SUM over live holds. Holds are converted
+    (released, then taken off stock) by place_order, and expired ones are
+    returned by the ``release_reservations`` command.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    objects = StockReservationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} holds {self.quantity} x {self.product.name}"
@@ -0,0 +1,124 @@
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class KeysetPaginator:
+    """Cursor pagination over an ordered queryset.
+
+    ``ordering`` is a sequence of field names (``-`` for descending) whose
+    last entry must be unique, e.g. ``('-created_at', '-id')``. Each page is
+    a single indexed range scan, so page 500 costs the same as page 1.
+    Cursors are signed so they cannot be forged into arbitrary filters, and
+    carry their ordering so one made for another sort is treated as absent.
+    """
+
+    salt = 'store.pagination'
+
+    def __init__(self, queryset, ordering, per_page=24):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [f.lstrip('-') for f in self.ordering]
+
+    def encode_cursor(self, obj, direction):
+        values = [str(getattr(obj, field)) for field in self.fields]
+        return signing.dumps(
+            {'v': values, 'd': direction, 'o': list(self.ordering)}, salt=self.salt, compress=True
+        )
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            data = signing.loads(cursor, salt=self.salt)
+        except signing.BadSignature:
+            return None
+        if (
+            data.get('d') not in ('next', 'prev')
+            or data.get('o') != list(self.ordering)
+            or len(data.get('v', [])) != len(self.fields)
+        ):
+            return None
+        try:
+            data['v'] = [self._field(name).to_python(value) for name, value in zip(self.fields, data['v'])]
+        except ValidationError:
+            # Values that don't fit the fields (e.g. a cursor for another
+            # queryset with the same ordering) are treated as no cursor
+            return None
+        return data
+
+    def _field(self, name):
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.queryset.model._meta.get_field(name)
+
+    def _seek(self, values, reverse):
+        # (a, b) > (x, y)  ==>  a > x OR (a = x AND b > y)
+        condition = Q()
+        for i, ordering in enumerate(self.ordering):
+            descending = ordering.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            term = Q(**{f'{self.fields[i]}__{lookup}': values[i]})
+            for field, value in zip(self.fields[:i], values[:i]):
+                term &= Q(**{field: value})
+            condition |= term
+        # Redundant bound on the leading column lets the database seek the
+        # index instead of scanning from the start and filtering the OR
+        descending = self.ordering[0].startswith('-') != reverse
+        lookup = 'lte' if descending else 'gte'
+        return Q(**{f'{self.fields[0]}__{lookup}': values[0]}) & condition
+
+    def get_page(self, cursor=None):
+        data = self.decode_cursor(cursor)
+        backwards = data is not None and data['d'] == 'prev'
+        ordering = self.ordering
+        if backwards:
+            ordering = tuple(f[1:] if f.startswith('-') else '-' + f for f in ordering)
+
+        queryset = self.queryset.order_by(*ordering)
+        if data is not None:
+            queryset = queryset.filter(self._seek(data['v'], backwards))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage(rows)
+
+        has_next = has_more if not backwards else True
+        has_previous = has_more if backwards else data is not None
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], 'next') if has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], 'prev') if has_previous else None,
+        )
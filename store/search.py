@@ -0,0 +1,190 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+
+class BaseSearchBackend:
+    """Full-text search over products.
+
+    ``search()`` narrows a product queryset to matches and annotates
+    ``search_rank``, where lower is better, so it can be used directly as
+    a keyset ordering key.
+    """
+
+    @property
+    def product_table(self):
+        from .models import Product
+
+        return Product._meta.db_table
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def install(self):
+        """Create whatever index structures the backend needs (idempotent)."""
+
+    def rebuild(self, product_ids=None, batch_size=2000):
+        """Re-index the given products, or everything when ``product_ids`` is None."""
+        return 0
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """LIKE scan fallback for databases without a full-text engine."""
+
+    def search(self, queryset, query):
+        return queryset.filter(
+            Q(name__icontains=query) | Q(description__icontains=query)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """SQLite FTS5 index kept in sync by triggers, ranked with BM25.
+
+    The index is a standalone FTS5 table keyed by product id. Triggers are
+    (re)installed after every migrate because SQLite drops them whenever
+    Django rebuilds ``store_product`` during an ALTER.
+    """
+
+    table = 'store_product_fts'
+    # bm25() column weights: a name hit counts for more than a description hit
+    weights = (10.0, 1.0)
+
+    def match_expression(self, query):
+        tokens = ['"%s"' % token for token in re.findall(r'\w+', query)]
+        # Quoting keeps user input from being parsed as FTS syntax; only the
+        # last word is treated as a prefix, as it may still be being typed
+        if tokens:
+            tokens[-1] += '*'
+        return ' '.join(tokens)
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+        t = self.table
+        products = queryset.model._meta.db_table
+        # bm25() only exists inside a MATCH query, so the rank is a
+        # correlated lookup by rowid, which FTS5 answers from the same index
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {t} WHERE {t} MATCH %s", (match,))
+        ).annotate(search_rank=RawSQL(
+            f"SELECT bm25({t}, %s, %s) FROM {t} WHERE {t} MATCH %s AND {t}.rowid = {products}.id",
+            (*self.weights, match),
+            output_field=FloatField(),
+        ))
+
+    def install(self):
+        t = self.table
+        products = self.product_table
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [t])
+            created = cursor.fetchone() is None
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {t} USING fts5("
+                "name, description, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+            )
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {t}_ai AFTER INSERT ON {products} BEGIN
+                    INSERT INTO {t}(rowid, name, description)
+                    VALUES (new.id, new.name, COALESCE(new.description, ''));
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {t}_ad AFTER DELETE ON {products} BEGIN
+                    DELETE FROM {t} WHERE rowid = old.id;
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {t}_au AFTER UPDATE OF name, description ON {products} BEGIN
+                    DELETE FROM {t} WHERE rowid = old.id;
+                    INSERT INTO {t}(rowid, name, description)
+                    VALUES (new.id, new.name, COALESCE(new.description, ''));
+                END
+            """)
+        if created:
+            self.rebuild()
+
+    def rebuild(self, product_ids=None, batch_size=2000):
+        from .models import Product
+
+        if product_ids is None:
+            # One transaction for the whole rebuild, so searches keep seeing
+            # the old index until the new one is complete, and a failure
+            # halfway leaves it untouched
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(f"DELETE FROM {self.table}")
+                return self._index(
+                    Product.objects.order_by('id').values_list('id', flat=True).iterator(), batch_size
+                )
+        return self._index(product_ids, batch_size)
+
+    def _index(self, product_ids, batch_size):
+        indexed = 0
+        batch = []
+        for product_id in product_ids:
+            batch.append(product_id)
+            if len(batch) == batch_size:
+                indexed += self._index_batch(batch)
+                batch = []
+        if batch:
+            indexed += self._index_batch(batch)
+        return indexed
+
+    def _index_batch(self, ids):
+        t = self.table
+        placeholders = ', '.join(['%s'] * len(ids))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {t} WHERE rowid IN ({placeholders})", ids)
+            cursor.execute(
+                f"INSERT INTO {t}(rowid, name, description) "
+                f"SELECT id, name, COALESCE(description, '') FROM {self.product_table} WHERE id IN ({placeholders})",
+                ids,
+            )
+            return cursor.rowcount
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """``tsvector`` search backed by a GIN expression index.
+
+    The index is built on the exact expression used in queries, so there is
+    no stored column to keep in sync and ``rebuild()`` has nothing to do.
+    """
+
+    config = 'english'
+    document = (
+        "to_tsvector('{config}', COALESCE({prefix}name, '') || ' ' || "
+        "COALESCE({prefix}description, ''))"
+    )
+
+    def search(self, queryset, query):
+        products = queryset.model._meta.db_table
+        document = self.document.format(config=self.config, prefix=f'{products}.')
+        tsquery = f"websearch_to_tsquery('{self.config}', %s)"
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT id FROM {products} WHERE {document} @@ {tsquery}", (query,))
+        ).annotate(search_rank=RawSQL(
+            f"-ts_rank({document}, {tsquery})", (query,), output_field=FloatField()
+        ))
+
+    def install(self):
+        document = self.document.format(config=self.config, prefix='')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.product_table}_search_idx "
+                f"ON {self.product_table} USING GIN ({document})"
+            )
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    return import_string(settings.SEARCH_BACKEND)()
+
+
+def install_search_backend(sender, **kwargs):
+    get_search_backend().install()
@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import bump_product_version, bump_tags, invalidate_reviews
+from .models import Brand, Category, Product, ProductImage, Review
+
+
+# Invalidate after commit, so a reader can't re-cache old data mid-transaction
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    product_id = instance.id  # cleared on the instance once a delete finishes
+
+    def invalidate():
+        bump_product_version(product_id)
+        bump_tags('products')
+    transaction.on_commit(invalidate)
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def product_image_changed(sender, instance, **kwargs):
+    product_id = instance.product_id
+
+    def invalidate():
+        bump_product_version(product_id)
+        bump_tags('products')
+    transaction.on_commit(invalidate)
+
+
+@receiver([post_save, post_delete], sender=Review)
+def review_changed(sender, instance, **kwargs):
+    product_id = instance.product_id
+
+    def invalidate():
+        invalidate_reviews(product_id)
+        # The snapshot and the listing cards carry the rating summary
+        bump_product_version(product_id)
+        bump_tags('products')
+    transaction.on_commit(invalidate)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_tags('categories'))
+
+
+@receiver([post_save, post_delete], sender=Brand)
+def brand_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_tags('brands'))
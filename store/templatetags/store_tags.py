@@ -0,0 +1,35 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from ..caching import PRODUCT_CARD_TIMEOUT, product_card_key
+
+register = template.Library()
+
+
+@register.simple_tag
+def product_card(product):
+    """Body of a listing card, shared by every visitor and cached per product.
+
+    ``product`` should come from ``Product.objects.for_listing()``. Anything
+    per-user (the wishlist heart) goes outside, see ``wishlist_heart``.
+    """
+    key = product_card_key(product)
+    html = cache.get(key)
+    if html is None:
+        html = get_template('store/product_card.html').render({'product': product})
+        cache.set(key, html, PRODUCT_CARD_TIMEOUT)
+    return mark_safe(html)
+
+
+@register.simple_tag(takes_context=True)
+def wishlist_heart(context, product):
+    """The visitor's wishlist toggle for a card, on pages that pass ``wishlist_ids``."""
+    wishlist_ids = context.get('wishlist_ids')
+    if wishlist_ids is None or not context['request'].user.is_authenticated:
+        return ''
+    return get_template('store/wishlist_heart.html').render({
+        'product': product,
+        'in_wishlist': product.id in wishlist_ids,
+    })
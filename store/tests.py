@@ -1,3 +1,540 @@
-from django.test import TestCase
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.template import engines
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from orders.models import Order, OrderItem
+from .models import Category, Brand, Product, ProductImage, Review
+from .pagination import KeysetPaginator
+from .search import get_search_backend
+from .facets import facet_counts, parse_id, parse_price_range
+
+
+def make_products(category, brand, count, start=0):
+    products = []
+    for i in range(start, start + count):
+        product = Product.objects.create(
+            category=category,
+            brand=brand,
+            name=f"Product {i}",
+            slug=f"product-{i}",
+            price=100 + i,
+            stock=10,
+        )
+        ProductImage.objects.create(product=product, image=f"product_images/{i}-a.jpg")
+        ProductImage.objects.create(product=product, image=f"product_images/{i}-b.jpg", is_featured=True)
+        products.append(product)
+    return products
+
+
+class CatalogListingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Electronics", slug="electronics")
+        cls.brand = Brand.objects.create(name="Demo Brand")
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_featured_image_prefers_is_featured(self):
+        product = make_products(self.category, self.brand, 1)[0]
+        listed = Product.objects.for_listing().get(pk=product.pk)
+        self.assertEqual(listed.featured_image.image.name, "product_images/0-b.jpg")
+        self.assertEqual(product.featured_image.image.name, "product_images/0-b.jpg")
+
+    def test_listing_query_count_is_constant(self):
+        urls = [
+            reverse("home"),
+            reverse("category_products", args=[self.category.slug]),
+            reverse("search") + "?q=Product",
+        ]
+        make_products(self.category, self.brand, 2)
+        small = [self.count_queries(url) for url in urls]
+
+        make_products(self.category, self.brand, 20, start=2)
+        large = [self.count_queries(url) for url in urls]
+
+        self.assertEqual(small, large)
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Books", slug="books")
+        for i in range(7):
+            # Duplicate prices so the id tie-breaker is exercised
+            Product.objects.create(category=category, name=f"Book {i}", slug=f"book-{i}", price=i // 2)
+
+    def test_walks_forward_and_back_without_gaps(self):
+        paginator = KeysetPaginator(Product.objects.all(), ("price", "id"), per_page=3)
+        expected = list(Product.objects.order_by("price", "id"))
+
+        seen, cursors, page = [], [], paginator.get_page()
+        while True:
+            seen.extend(page)
+            cursors.append(page)
+            if not page.has_next:
+                break
+            page = paginator.get_page(page.next_cursor)
+        self.assertEqual(seen, expected)
+        self.assertFalse(cursors[0].has_previous)
+
+        previous = paginator.get_page(cursors[-1].previous_cursor)
+        self.assertEqual(list(previous), list(cursors[-2]))
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        paginator = KeysetPaginator(Product.objects.all(), ("-created_at", "-id"), per_page=3)
+        self.assertEqual(list(paginator.get_page("garbage")), list(paginator.get_page()))
+
+    def test_cursor_from_another_ordering_falls_back_to_first_page(self):
+        by_price = KeysetPaginator(Product.objects.all(), ("price", "id"), per_page=3).get_page()
+        cursor = by_price.next_cursor
+        newest = KeysetPaginator(Product.objects.all(), ("-created_at", "-id"), per_page=3)
+        self.assertEqual(list(newest.get_page(cursor)), list(newest.get_page()))
+
+        for url in [reverse("home"), reverse("search") + "?sort=rating", reverse("search") + "?q=Book"]:
+            separator = "&" if "?" in url else "?"
+            self.assertEqual(self.client.get(f"{url}{separator}cursor={cursor}").status_code, 200)
+
+    def test_values_that_dont_fit_the_fields_fall_back_to_first_page(self):
+        paginator = KeysetPaginator(Product.objects.all(), ("-created_at", "-id"), per_page=3)
+        forged = KeysetPaginator(Product.objects.all(), ("-created_at", "-id"), per_page=3)
+        product = Product.objects.first()
+        product.created_at = "123.00"
+        cursor = forged.encode_cursor(product, "next")
+        self.assertIsNone(paginator.decode_cursor(cursor))
+        self.assertEqual(list(paginator.get_page(cursor)), list(paginator.get_page()))
+
+    def test_cursor_values_are_converted_to_field_types(self):
+        products = get_search_backend().search(Product.objects.all(), "book")
+        paginator = KeysetPaginator(products, ("search_rank", "id"), per_page=3)
+        cursor = paginator.get_page().next_cursor
+        self.assertEqual([type(value) for value in paginator.decode_cursor(cursor)["v"]], [float, int])
+
+        expected = list(products.order_by("search_rank", "id"))
+        self.assertEqual(list(paginator.get_page(cursor)), expected[3:6])
+
+    def test_home_paginates(self):
+        response = self.client.get(reverse("home"))
+        page = response.context["products"]
+        self.assertEqual(len(page), 7)
+        self.assertFalse(page.has_next)
+
+
+class SearchBackendTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Electronics", slug="electronics")
+        cls.phone = Product.objects.create(
+            category=category, name="Smartphone", slug="smartphone", price=14999,
+            description="A phone with a great camera",
+        )
+        cls.camera = Product.objects.create(
+            category=category, name="Camera", slug="camera", price=24999,
+            description="Mirrorless body",
+        )
+
+    def search(self, query):
+        return list(get_search_backend().search(Product.objects.all(), query).order_by("search_rank", "id"))
+
+    def test_ranks_name_matches_first(self):
+        self.assertEqual(self.search("camera"), [self.camera, self.phone])
+
+    def test_prefix_and_hostile_input(self):
+        self.assertEqual(self.search("smart"), [self.phone])
+        self.assertEqual(self.search('"smart* ('), [self.phone])
+        self.assertEqual(self.search("***"), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.camera.name = "Tripod"
+        self.camera.description = ""
+        self.camera.save()
+        self.assertEqual(self.search("camera"), [self.phone])
+        self.assertEqual(self.search("tripod"), [self.camera])
+
+        self.phone.delete()
+        self.assertEqual(self.search("camera"), [])
+
+    def test_rebuild_picks_up_bulk_changes(self):
+        Product.objects.bulk_create([
+            Product(category=self.phone.category, name="Speaker", slug="speaker", price=999)
+        ])
+        self.assertEqual(get_search_backend().rebuild(), 3)
+        self.assertEqual([p.slug for p in self.search("speaker")], ["speaker"])
+
+    def test_failed_rebuild_keeps_the_old_index(self):
+        backend = get_search_backend()
+        index_batch = backend._index_batch
+        batches = []
+
+        def fail_second_batch(ids):
+            batches.append(ids)
+            if len(batches) == 2:
+                raise RuntimeError("disk full")
+            return index_batch(ids)
+
+        with patch.object(backend, "_index_batch", side_effect=fail_second_batch):
+            with self.assertRaises(RuntimeError):
+                backend.rebuild(batch_size=1)
+        self.assertEqual(self.search("camera"), [self.camera, self.phone])
+
+    def test_search_view_orders_by_relevance(self):
+        response = self.client.get(reverse("search") + "?q=camera")
+        self.assertEqual(list(response.context["products"]), [self.camera, self.phone])
+
+
+class FacetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = Category.objects.create(name="Books", slug="books")
+        cls.games = Category.objects.create(name="Games", slug="games")
+        cls.acme = Brand.objects.create(name="Acme")
+        cls.other = Brand.objects.create(name="Other")
+        rows = [
+            (cls.books, cls.acme, 100), (cls.books, cls.acme, 700),
+            (cls.books, cls.other, 1500), (cls.games, cls.acme, 3000),
+        ]
+        for i, (category, brand, price) in enumerate(rows):
+            Product.objects.create(category=category, brand=brand, name=f"Item {i}", slug=f"item-{i}", price=price)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counts_are_disjunctive_and_single_query(self):
+        with self.assertNumQueries(1):
+            facets = facet_counts(Product.objects.all(), brand=self.acme.id)
+        # Categories honour the brand filter, brands ignore it
+        self.assertEqual(facets["category"], {self.books.id: 2, self.games.id: 1})
+        self.assertEqual(facets["brand"], {self.acme.id: 3, self.other.id: 1})
+        self.assertEqual(facets["price"], {"0-500": 1, "500-1000": 1, "1000-2000": 0, "2000-5000": 1})
+
+        with self.assertNumQueries(0):
+            facet_counts(Product.objects.all(), brand=self.acme.id)
+
+    def test_price_filter_applies_to_other_facets(self):
+        facets = facet_counts(Product.objects.all(), price=parse_price_range("0-1000"))
+        self.assertEqual(facets["category"], {self.books.id: 2})
+        self.assertEqual(facets["brand"], {self.acme.id: 2})
+
+    def test_malformed_params_are_ignored(self):
+        for params in ["price=abc", "price=1-2-3", "price=-", "price=9-1", "price=nan-inf", "category=x&brand=1.5",
+                       "category=²", "brand=٣", "category=0", "brand=99999999999999999999999"]:
+            response = self.client.get(reverse("search") + "?" + params)
+            self.assertEqual(response.status_code, 200, params)
+            self.assertEqual(len(response.context["products"]), 4, params)
+
+    def test_parse_id_accepts_only_positive_ascii_integers(self):
+        self.assertEqual(parse_id("42"), 42)
+        for value in [None, "", "0", "-1", "²", "٣", " 1", "1e3", str(2 ** 63)]:
+            self.assertIsNone(parse_id(value), value)
+
+    def test_search_view_filters_and_exposes_facets(self):
+        response = self.client.get(reverse("search"), {"q": "item", "category": self.books.id, "price": "0-1000"})
+        self.assertEqual(len(response.context["products"]), 2)
+        prices = {f["value"]: f["count"] for f in response.context["facets"]["price"]}
+        self.assertEqual(prices["1000-2000"], 1)
+
+
+class RatingAggregateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Books", slug="books")
+        cls.product = Product.objects.create(category=category, name="Novel", slug="novel", price=399)
+        cls.user = User.objects.create_user("reader", password="pass12345")
+        order = Order.objects.create(user=cls.user, total_amount=399, status="DELIVERED")
+        cls.order_item = OrderItem.objects.create(order=order, product=cls.product, price=399)
+
+    def assertRatings(self, avg, count, histogram):
+        self.product.refresh_from_db()
+        self.assertAlmostEqual(self.product.rating_avg, avg)
+        self.assertEqual(self.product.rating_count, count)
+        self.assertEqual([c for _star, c, _pct in self.product.rating_histogram], histogram)
+
+    def test_review_views_maintain_aggregates(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse("add_review", args=[self.order_item.id]), {"rating": 4, "review": "Good"})
+        self.assertRatings(4.0, 1, [0, 1, 0, 0, 0])
+
+        review = Review.objects.get()
+        self.client.post(reverse("edit_review", args=[review.id]), {"rating": 2, "review": "Meh"})
+        self.assertRatings(2.0, 1, [0, 0, 0, 1, 0])
+
+        self.client.post(reverse("delete_review", args=[review.id]))
+        self.assertRatings(0.0, 0, [0, 0, 0, 0, 0])
+
+    def test_adjust_rating_is_incremental(self):
+        products = Product.objects.filter(pk=self.product.pk)
+        products.adjust_rating(added=5)
+        products.adjust_rating(added=4)
+        products.adjust_rating(added=3)
+        self.assertRatings(4.0, 3, [1, 1, 1, 0, 0])
+        products.adjust_rating(added=1, removed=5)
+        self.assertRatings(8 / 3, 3, [0, 1, 1, 0, 1])
+
+    def test_rebuild_command_recomputes_from_reviews(self):
+        for rating in (5, 5, 2):
+            Review.objects.create(product=self.product, user=self.user, rating=rating, review="x")
+        call_command("rebuild_ratings", batch_size=1, stdout=StringIO())
+        self.assertRatings(4.0, 3, [2, 0, 0, 1, 0])
+
+    def test_top_rated_sort(self):
+        other = Product.objects.create(category=self.product.category, name="Atlas", slug="atlas", price=99)
+        Product.objects.filter(pk=other.pk).adjust_rating(added=5)
+        Product.objects.filter(pk=self.product.pk).adjust_rating(added=3)
+        response = self.client.get(reverse("search"), {"sort": "rating"})
+        self.assertEqual(list(response.context["products"]), [other, self.product])
+
+
+class ProductReviewPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Books", slug="books")
+        cls.product = Product.objects.create(category=category, name="Novel", slug="novel", price=399)
+        users = [User.objects.create_user(f"reader{i}") for i in range(13)]
+        Review.objects.bulk_create([
+            Review(product=cls.product, user=user, rating=5, review=f"Review {i}")
+            for i, user in enumerate(users)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_shows_first_page_and_endpoint_continues(self):
+        response = self.client.get(reverse("product_detail", args=[self.product.slug]))
+        first = response.context["reviews"]
+        self.assertEqual(len(first), 10)
+        self.assertTrue(first.has_next)
+
+        url = reverse("product_reviews", args=[self.product.slug])
+        # Product lookup + one review query with users joined in
+        with self.assertNumQueries(2):
+            data = self.client.get(url, {"cursor": first.next_cursor}).json()
+        self.assertEqual(data["html"].count("review-card"), 3)
+        self.assertIsNone(data["next_cursor"])
+
+    def test_first_page_is_cached_until_a_review_changes(self):
+        url = reverse("product_reviews", args=[self.product.slug])
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.product, user=User.objects.first(), rating=1, review="Newest")
+        self.assertIn("Newest", self.client.get(url).json()["html"])
+
+
+class ProductDetailCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Books", slug="books")
+        cls.product = Product.objects.create(category=category, name="Novel", slug="novel", price=399)
+        ProductImage.objects.create(product=cls.product, image="product_images/novel.jpg")
+        cls.user = User.objects.create_user("reader", password="pass12345")
+        order = Order.objects.create(user=cls.user, total_amount=399, status="DELIVERED")
+        cls.order_item = OrderItem.objects.create(order=order, product=cls.product, price=399)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("product_detail", args=[self.product.slug])
+
+    def test_warm_anonymous_page_needs_no_queries(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context["product"], self.product)
+        self.assertEqual(len(response.context["images"]), 1)
+
+    def test_user_flags_come_from_one_query(self):
+        self.client.force_login(self.user)
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        view_queries = [q for q in ctx.captured_queries if "store_product" in q["sql"]]
+        self.assertEqual(len(view_queries), 1)
+        self.assertFalse(response.context["in_wishlist"])
+        self.assertEqual(response.context["review_item_id"], self.order_item.id)
+
+    def test_saves_invalidate_snapshot(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Renamed"
+            self.product.save()
+        self.assertEqual(self.client.get(self.url).context["product"].name, "Renamed")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductImage.objects.create(product=self.product, image="product_images/back.jpg")
+        self.assertEqual(len(self.client.get(self.url).context["images"]), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.is_available = False
+            self.product.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+@override_settings(ANONYMOUS_PAGE_CACHE_TIMEOUT=300)
+class AnonymousPageCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Electronics", slug="electronics")
+        cls.brand = Brand.objects.create(name="Demo Brand")
+        cls.product = make_products(cls.category, cls.brand, 1)[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_warm_home_needs_no_queries(self):
+        first = self.client.get(reverse("home"))
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse("home"))
+        self.assertEqual(second.content, first.content)
+        self.assertIn("Cookie", second["Vary"])
+
+    def test_key_ignores_param_order_empty_values_and_tracking(self):
+        url = reverse("search")
+        self.client.get(url, {"q": "Product", "sort": "low"})
+        with self.assertNumQueries(0):
+            self.client.get(url + "?sort=low&brand=&utm_source=mail&q=Product")
+        # A different filter is a different page
+        self.assertIsNotNone(self.client.get(url, {"q": "Product", "sort": "high"}).context)
+
+    def test_saves_invalidate_tagged_pages(self):
+        home = reverse("home")
+        listing = reverse("category_products", args=[self.category.slug])
+        self.client.get(home)
+        self.client.get(listing)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Renamed"
+            self.product.save()
+        self.assertContains(self.client.get(home), "Renamed")
+        self.assertContains(self.client.get(listing), "Renamed")
+
+        # Category pages don't show brands, so a brand edit leaves them cached
+        with self.captureOnCommitCallbacks(execute=True):
+            self.brand.name = "New Brand"
+            self.brand.save()
+        with self.assertNumQueries(0):
+            self.client.get(listing)
+        self.assertIsNotNone(self.client.get(home).context)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Gadgets"
+            self.category.save()
+        self.assertContains(self.client.get(listing), "Gadgets")
+
+    def test_guest_cart_cookie_neither_fills_nor_reads_the_shared_page(self):
+        guest = Client()
+        guest.get(reverse("add_to_cart", args=[self.product.id]))
+        self.assertIn("guest_cart", guest.cookies)
+        # Leave only the cart cookie, the one the badge is read from
+        for name in list(guest.cookies):
+            if name != "guest_cart":
+                del guest.cookies[name]
+        self.assertContains(guest.get(reverse("home")), 'class="cart-count"')
+        self.assertNotContains(self.client.get(reverse("home")), 'class="cart-count"')
+
+        # And a page cached for cookieless visitors isn't served to the guest
+        self.assertContains(guest.get(reverse("home")), 'class="cart-count"')
+
+    def test_visitors_with_a_session_are_not_served_cached_pages(self):
+        self.client.get(reverse("home"))
+        user = User.objects.create_user("shopper", password="pass12345")
+        self.client.force_login(user)
+        self.assertContains(self.client.get(reverse("home")), "Hello, shopper")
+
+
+class ProductCardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Electronics", slug="electronics")
+        cls.product = make_products(cls.category, None, 1)[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self, **context):
+        template = engines["django"].from_string("{% load store_tags %}{% product_card product %}")
+        return template.render({"product": Product.objects.for_listing().get(pk=self.product.pk), **context})
+
+    def test_card_is_cached_until_what_it_shows_changes(self):
+        first = self.render()
+        self.assertIn("product_images/0-b.jpg", first)
+        with patch("store.templatetags.store_tags.get_template") as get_template:
+            self.assertEqual(self.render(), first)
+        get_template.assert_not_called()
+
+        # adjust_rating() stamps updated_at
+        Product.objects.filter(pk=self.product.pk).adjust_rating(added=4)
+        self.assertIn("⭐ 4.0 (1)", self.render())
+
+        # rebuild_ratings doesn't, so the rating itself is part of the key
+        user = User.objects.create_user("reader")
+        Review.objects.bulk_create([Review(product=self.product, user=user, rating=2, review="Meh")])
+        call_command("rebuild_ratings", stdout=StringIO())
+        self.assertIn("⭐ 2.0 (1)", self.render())
+
+        Product.objects.filter(pk=self.product.pk).update(name="Renamed")
+        self.assertNotIn("Renamed", self.render())
+        self.product.refresh_from_db()
+        self.product.save()
+        self.assertIn("Renamed", self.render())
+
+    def test_wishlist_heart_stays_out_of_the_shared_card(self):
+        user = User.objects.create_user("shopper", password="pass12345")
+        self.client.force_login(user)
+        self.client.post(reverse("toggle_wishlist_api", args=[self.product.id]))
+        self.assertContains(self.client.get(reverse("home")), "fa-solid fa-heart")
+        self.assertNotIn("wishlist-toggle", self.render())
+
+        self.client.logout()
+        self.assertNotContains(self.client.get(reverse("home")), "wishlist-toggle")
+
+
+class ProductAdminTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Books", slug="books")
+        cls.product = Product.objects.create(category=cls.category, name="Novel", slug="novel", price=399, stock=10)
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "pass12345")
+
+    def test_change_form_keeps_counters_moved_while_it_was_open(self):
+        self.client.force_login(self.admin)
+        url = reverse("admin:store_product_change", args=[self.product.id])
+        form = self.client.get(url).context["adminform"].form
+        self.assertNotIn("reserved", form.fields)
+
+        self.assertNotIn("rating_count", form.fields)
+
+        # A checkout holds stock and a review lands after the form was loaded
+        Product.objects.filter(pk=self.product.pk).reserve({self.product.id: 3})
+        Product.objects.filter(pk=self.product.pk).adjust_rating(added=4)
+        response = self.client.post(url, {
+            "category": self.category.id, "name": "Novel (2nd ed.)", "slug": "novel",
+            "description": "", "price": "399", "stock": "10", "is_available": "on",
+            "images-TOTAL_FORMS": "0", "images-INITIAL_FORMS": "0",
+        })
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.reserved), ("Novel (2nd ed.)", 3))
+        self.assertEqual((self.product.rating_count, self.product.rating_4_count), (1, 1))
@@ -13,6 +13,7 @@ urlpatterns = [
 
 
     path('product/<slug:slug>/', views.product_detail, name='product_detail'),
+    path('product/<slug:slug>/reviews/', views.product_reviews, name='product_reviews'),
     path("category/<slug:category_slug>/", views.category_products, name="category_products"),
     path("search/", views.search_products, name="search"),
 
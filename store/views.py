@@ -1,29 +1,69 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Subquery
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
 from .models import Product, Category, Brand, ProductImage, Review
 from orders.models import OrderItem
+from wishlist.caching import get_wishlist_ids
 from wishlist.models import Wishlist
-from django.db.models import Q
 from .forms import ReviewForm
+from .pagination import KeysetPaginator
+from .search import get_search_backend
+from .caching import cache_anonymous_page, first_review_page_key, get_product_snapshot
+from .facets import PRICE_BUCKETS, facet_counts, parse_id, parse_price_range, price_q
 from django.contrib import messages
+from django.db import transaction
+
+PRODUCTS_PER_PAGE = 24
+REVIEWS_PER_PAGE = 10
+REVIEW_CACHE_TIMEOUT = 60 * 60
+
+# Keyset orderings; the last field must be unique
+LISTING_ORDERING = ('-created_at', '-id')
+SEARCH_ORDERINGS = {
+    'low': ('price', 'id'),
+    'high': ('-price', '-id'),
+    'new': ('-id',),
+    'rating': ('-rating_avg', '-rating_count', '-id'),
+}
+RELEVANCE_ORDERING = ('search_rank', 'id')
+
+
+def paginate_products(request, products, ordering=LISTING_ORDERING):
+    paginator = KeysetPaginator(products, ordering, per_page=PRODUCTS_PER_PAGE)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def review_paginator(product_id):
+    reviews = Review.objects.filter(product_id=product_id).select_related('user')
+    return KeysetPaginator(reviews, ('-date', '-id'), per_page=REVIEWS_PER_PAGE)
+
+
+def first_review_page(product_id):
+    key = first_review_page_key(product_id)
+    page = cache.get(key)
+    if page is None:
+        page = review_paginator(product_id).get_page()
+        cache.set(key, page, REVIEW_CACHE_TIMEOUT)
+    return page
 
 
 
 
 
 # 🏠 Home Page
+@cache_anonymous_page('products', 'categories', 'brands')
 def home(request):
-    products = Product.objects.filter(is_available=True).prefetch_related('images')
+    products = paginate_products(request, Product.objects.available().for_listing())
     categories = Category.objects.filter(is_active=True)
     brands = Brand.objects.filter(is_active=True)
 
-    # ⭐ Add Wishlist IDs for logged-in users
-    wishlist_ids = []
+    # ⭐ Add Wishlist IDs for logged-in users (cached set, dropped on toggle)
+    wishlist_ids = frozenset()
     if request.user.is_authenticated:
-        wishlist_ids = list(
-            Wishlist.objects.filter(user=request.user)
-            .values_list('product_id', flat=True)
-        )
+        wishlist_ids = get_wishlist_ids(request.user)
 
     return render(request, 'store/home.html', {
         'products': products,
@@ -36,59 +76,92 @@ def home(request):
 
 # 📦 Product Detail Page
 def product_detail(request, slug):
-    product = get_object_or_404(Product, slug=slug, is_available=True)
-    images = ProductImage.objects.filter(product=product)
-
-    # wishlist checking already here
+    def load():
+        product = Product.objects.select_related('category', 'brand').filter(
+            slug=slug, is_available=True
+        ).first()
+        if product is None:
+            return None
+        return {'product': product, 'images': list(product.images.order_by('-is_featured', 'id'))}
+
+    # Product, images, brand, category and rating summary are the same for
+    # every visitor and come from a versioned cache entry
+    snapshot = get_product_snapshot(slug, load)
+    if snapshot is None:
+        raise Http404("No Product matches the given query.")
+    product = snapshot['product']
+
+    # Fetch reviews (first page is cached per product)
+    reviews = first_review_page(product.id)
+
+    # Per-user bits resolved together in one query
     in_wishlist = False
+    review_item_id = None
     if request.user.is_authenticated:
-        in_wishlist = Wishlist.objects.filter(user=request.user, product=product).exists()
-
-    # Fetch reviews
-    reviews = product.reviews.all()
-
-    # Check if user can review
-    can_review = False
-    if request.user.is_authenticated:
-        can_review = OrderItem.objects.filter(
-            order__user=request.user,
-            order__status="Delivered",
-            product=product
-        ).exists()
+        in_wishlist, review_item_id = Product.objects.filter(pk=product.id).annotate(
+            in_wishlist=Exists(Wishlist.objects.filter(user=request.user, product=OuterRef('pk'))),
+            review_item_id=Subquery(
+                OrderItem.objects.filter(
+                    order__user=request.user,
+                    order__status="DELIVERED",
+                    product=OuterRef('pk'),
+                    review__isnull=True,
+                ).values('id')[:1]
+            ),
+        ).values_list('in_wishlist', 'review_item_id').get()
 
     return render(request, 'store/product_detail.html', {
         'product': product,
-        'images': images,
+        'images': snapshot['images'],
         'in_wishlist': in_wishlist,
         'reviews': reviews,
-        'can_review': can_review,
+        'can_review': review_item_id is not None,
+        'review_item_id': review_item_id,
     })
 
 
+# 💬 Review pages for infinite scroll
+def product_reviews(request, slug):
+    product = get_object_or_404(Product.objects.only('id'), slug=slug, is_available=True)
+    cursor = request.GET.get('cursor')
+    reviews = review_paginator(product.id).get_page(cursor) if cursor else first_review_page(product.id)
+
+    html = render_to_string('store/review_list.html', {'reviews': reviews}, request=request)
+    return JsonResponse({'html': html, 'next_cursor': reviews.next_cursor})
+
+
+@cache_anonymous_page('products', 'categories')
 def category_products(request, category_slug):
     category = get_object_or_404(Category, slug=category_slug)
-    products = Product.objects.filter(category=category, is_available=True)
+    products = paginate_products(
+        request, Product.objects.available().for_listing().filter(category=category)
+    )
 
     return render(request, "store/category_products.html", {
         "category": category,
         "products": products,
     })
 
+@cache_anonymous_page('products', 'categories', 'brands')
 def search_products(request):
     query = request.GET.get("q", "")
-    category = request.GET.get("category")
-    brand = request.GET.get("brand")
-    price = request.GET.get("price")
+    # Malformed filter values are ignored rather than raising
+    category = parse_id(request.GET.get("category"))
+    brand = parse_id(request.GET.get("brand"))
+    price = parse_price_range(request.GET.get("price"))
     sort = request.GET.get("sort")
 
-    products = Product.objects.filter(is_available=True)
+    products = Product.objects.available().for_listing()
 
     # 🔍 TEXT SEARCH
+    ordering = SEARCH_ORDERINGS.get(sort, LISTING_ORDERING)
     if query:
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query)
-        )
+        products = get_search_backend().search(products, query)
+        if sort not in SEARCH_ORDERINGS:
+            ordering = RELEVANCE_ORDERING
+
+    # 📊 FACET COUNTS (one grouped query, cached per normalized query)
+    counts = facet_counts(products, query, category, brand, price)
 
     # 🏷 CATEGORY FILTER
     if category:
@@ -100,26 +173,36 @@ def search_products(request):
 
     # 💰 PRICE FILTER
     if price:
-        min_price, max_price = price.split("-")
-        products = products.filter(price__gte=min_price, price__lte=max_price)
+        products = products.filter(price_q(price))
 
-    # ↕ SORTING
-    if sort == "low":
-        products = products.order_by("price")
-    elif sort == "high":
-        products = products.order_by("-price")
-    elif sort == "new":
-        products = products.order_by("-id")
+    # ↕ SORTING + PAGINATION
+    products = paginate_products(request, products, ordering)
 
     # Load categories & brands for dropdown
-    categories = Category.objects.filter(is_active=True)
-    brands = Brand.objects.filter(is_active=True)
+    categories = list(Category.objects.filter(is_active=True))
+    brands = list(Brand.objects.filter(is_active=True))
+
+    facets = {
+        "category": [
+            {"id": c.id, "name": c.name, "count": counts["category"][c.id]}
+            for c in categories if c.id in counts["category"]
+        ],
+        "brand": [
+            {"id": b.id, "name": b.name, "count": counts["brand"][b.id]}
+            for b in brands if b.id in counts["brand"]
+        ],
+        "price": [
+            {"value": value, "label": label, "count": counts["price"][value]}
+            for value, label in PRICE_BUCKETS
+        ],
+    }
 
     return render(request, "store/search_results.html", {
         "query": query,
         "products": products,
         "categories": categories,
         "brands": brands,
+        "facets": facets,
     })
 
 
@@ -146,7 +229,9 @@ def add_review(request, order_item_id):
             r.order_item = order_item
             r.product = order_item.product
             r.user = request.user
-            r.save()
+            with transaction.atomic():
+                r.save()
+                Product.objects.filter(pk=r.product_id).adjust_rating(added=r.rating)
 
             messages.success(request, "Review submitted!")
             return redirect('product_detail', slug=order_item.product.slug)
@@ -162,11 +247,17 @@ def add_review(request, order_item_id):
 @login_required
 def edit_review(request, review_id):
     review = get_object_or_404(Review, id=review_id, user=request.user)
+    old_rating = review.rating
 
     if request.method == "POST":
         form = ReviewForm(request.POST, instance=review)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
+                if review.rating != old_rating:
+                    Product.objects.filter(pk=review.product_id).adjust_rating(
+                        added=review.rating, removed=old_rating
+                    )
             messages.success(request, "Review updated successfully.")
             return redirect('product_detail', slug=review.product.slug)
     else:
@@ -185,7 +276,9 @@ def delete_review(request, review_id):
 
     if request.method == "POST":
         product_slug = review.product.slug
-        review.delete()
+        with transaction.atomic():
+            review.delete()
+            Product.objects.filter(pk=review.product_id).adjust_rating(removed=review.rating)
         messages.success(request, "Review deleted successfully.")
         return redirect('product_detail', slug=product_slug)
 
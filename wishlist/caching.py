@@ -0,0 +1,23 @@
+from django.core.cache import cache
+
+from .models import Wishlist
+
+WISHLIST_IDS_TIMEOUT = 24 * 60 * 60
+
+
+def wishlist_ids_key(user_id):
+    return f'wishlist:ids:{user_id}'
+
+
+def get_wishlist_ids(user):
+    """The set of product ids in ``user``'s wishlist, cached until they change it."""
+    key = wishlist_ids_key(user.id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(Wishlist.objects.filter(user=user).values_list('product_id', flat=True))
+        cache.set(key, ids, WISHLIST_IDS_TIMEOUT)
+    return ids
+
+
+def invalidate_wishlist_ids(user_id):
+    cache.delete(wishlist_ids_key(user_id))
@@ -0,0 +1,92 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+from django.test.utils import override_settings
+
+from store.models import Category, Product
+from wishlist.models import ProductSnapshot, Wishlist, WishlistNotification
+from wishlist.notifications import NOTIFY_BATCH_SIZE, enqueue_notifications, send_notifications
+
+BENCH_PREFIX = "bench-wishlist-"
+
+
+class Command(BaseCommand):
+    help = "Measure how long queueing (and optionally sending) wishlist alerts takes for a large wishlist table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=2_000)
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--per-user", type=int, default=100, help="Wishlist rows per user")
+        parser.add_argument("--batch-size", type=int, default=NOTIFY_BATCH_SIZE)
+        parser.add_argument("--send", action="store_true", help="Also time delivery, to a dummy mail backend")
+
+    def seed(self, options):
+        category, _ = Category.objects.get_or_create(slug="bench-wishlist", defaults={"name": "Bench Wishlist"})
+        with transaction.atomic():
+            # Half the catalogue starts sold out, the other half in stock
+            Product.objects.bulk_create([
+                Product(category=category, name=f"Bench product {i}", slug=f"{BENCH_PREFIX}{i}",
+                        price=500, stock=(i % 2) * 10)
+                for i in range(options["products"])
+            ], batch_size=1000)
+            User.objects.bulk_create([
+                User(username=f"{BENCH_PREFIX}{i}", email=f"user{i}@example.com")
+                for i in range(options["users"])
+            ], batch_size=1000)
+            product_ids = list(
+                Product.objects.filter(slug__startswith=BENCH_PREFIX).order_by("id").values_list("id", flat=True)
+            )
+            user_ids = list(
+                User.objects.filter(username__startswith=BENCH_PREFIX).order_by("id").values_list("id", flat=True)
+            )
+            per_user = min(options["per_user"], len(product_ids))
+            table = Wishlist._meta.db_table
+            added_at = connection.ops.adapt_datetimefield_value(Product.objects.latest("id").created_at)
+            with connection.cursor() as cursor:
+                for n, user_id in enumerate(user_ids):
+                    offset = (n * 7) % len(product_ids)
+                    picks = (product_ids[offset:] + product_ids[:offset])[:per_user]
+                    cursor.executemany(
+                        f"INSERT INTO {table} (user_id, product_id, added_at) VALUES (%s, %s, %s)",
+                        [(user_id, product_id, added_at) for product_id in picks],
+                    )
+        return category
+
+    def handle(self, *args, **options):
+        rows = options["users"] * min(options["per_user"], options["products"])
+        self.stdout.write(f"🟢 Seeding {rows:,} wishlist rows...")
+        category = self.seed(options)
+        products = Product.objects.filter(slug__startswith=BENCH_PREFIX)
+
+        try:
+            start = time.perf_counter()
+            enqueue_notifications(batch_size=options["batch_size"])
+            self.stdout.write(f"First run (snapshots only): {time.perf_counter() - start:.2f}s")
+
+            # Restock everything sold out and cut the price of the rest, so
+            # every wishlist row is due an alert
+            products.filter(stock=0).update(stock=5)
+            products.filter(stock=10).update(price=F("price") - 50)
+
+            start = time.perf_counter()
+            queued = enqueue_notifications(batch_size=options["batch_size"])
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"Queued {queued:,} alerts in {elapsed:.2f}s: {queued / elapsed:,.0f} rows/sec")
+
+            if options["send"]:
+                with override_settings(EMAIL_BACKEND="django.core.mail.backends.dummy.EmailBackend"):
+                    start = time.perf_counter()
+                    sent = send_notifications()
+                    elapsed = time.perf_counter() - start
+                self.stdout.write(f"Sent {sent:,} emails in {elapsed:.2f}s: {sent / elapsed:,.0f} emails/sec")
+        finally:
+            WishlistNotification.objects.filter(product__in=products).delete()
+            ProductSnapshot.objects.filter(product__in=products).delete()
+            Wishlist.objects.filter(product__in=products).delete()
+            products.delete()
+            User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+            category.delete()
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark finished"))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from wishlist.notifications import (
+    NOTIFY_BATCH_SIZE, SEND_BATCH_SIZE, enqueue_notifications, send_notifications,
+)
+
+
+class Command(BaseCommand):
+    help = "Queue back-in-stock and price-drop alerts for wishlisted products, then email them"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=NOTIFY_BATCH_SIZE,
+                            help="Changed products handled per transaction")
+        parser.add_argument("--send-batch-size", type=int, default=SEND_BATCH_SIZE)
+        parser.add_argument("--no-send", action="store_true", help="Only fill the outbox")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        queued = enqueue_notifications(batch_size=options["batch_size"])
+        self.stdout.write(f"🟢 Queued {queued} notifications in {time.perf_counter() - start:.2f}s")
+
+        if not options["no_send"]:
+            start = time.perf_counter()
+            sent = send_notifications(batch_size=options["send_batch_size"])
+            self.stdout.write(f"🟢 Sent {sent} emails in {time.perf_counter() - start:.2f}s")
+
+        self.stdout.write(self.style.SUCCESS("✅ Wishlist notifications done"))
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_stock_reservations'),
+        ('wishlist', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='wishlist',
+            index=models.Index(fields=['user', '-added_at', '-id'], name='wishlist_user_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_stock_reservations'),
+        ('wishlist', '0002_wishlist_user_recent_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSnapshot',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='wishlist_snapshot', serialize=False, to='store.product')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('stock', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WishlistNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('BACK_IN_STOCK', 'Back in stock'), ('PRICE_DROP', 'Price drop')], max_length=20)),
+                ('old_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('new_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='store.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('sent_at__isnull', True)), fields=['id'], name='wishlist_notify_pending_idx')],
+            },
+        ),
+    ]
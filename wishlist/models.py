@@ -1,14 +1,90 @@
-from django.db import models
+from django.db import connection, models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from store.models import Product
 
+
+class WishlistQuerySet(models.QuerySet):
+
+    def toggle(self, user_id, product_id):
+        """Flip a product's membership of a wishlist; returns True if it's now in.
+
+        Removing is a single DELETE. Only when nothing was deleted is the
+        row added, with an insert that skips a duplicate instead of failing,
+        so double clicks and parallel tabs can't trip the unique constraint.
+        Returns None if the product doesn't exist.
+        """
+        deleted, _ = self.filter(user_id=user_id, product_id=product_id).delete()
+        if deleted:
+            return False
+        if self.add(user_id, product_id):
+            return True
+        # Nothing inserted: either a concurrent add won, or there's no such product
+        return True if Product.objects.filter(id=product_id).exists() else None
+
+    def add(self, user_id, product_id):
+        """Insert the row if the product exists and it isn't there yet; returns rows added."""
+        table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (user_id, product_id, added_at) "
+                f"SELECT %s, id, %s FROM {Product._meta.db_table} WHERE id = %s "
+                f"ON CONFLICT (user_id, product_id) DO NOTHING",
+                [user_id, connection.ops.adapt_datetimefield_value(timezone.now()), product_id],
+            )
+            return cursor.rowcount
+
+
 class Wishlist(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     added_at = models.DateTimeField(auto_now_add=True)
 
+    objects = WishlistQuerySet.as_manager()
+
     class Meta:
         unique_together = ('user', 'product')  # Prevent duplicates
+        indexes = [
+            # my_wishlist keyset pagination
+            models.Index(fields=['user', '-added_at', '-id'], name='wishlist_user_recent_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.product.name}"
+
+
+class ProductSnapshot(models.Model):
+    """Price and stock as last seen by the wishlist notifier (wishlist.notifications)."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='wishlist_snapshot')
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    stock = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.product_id}: {self.price} x {self.stock}"
+
+
+class WishlistNotification(models.Model):
+    """Outbox of wishlist alerts; rows with no ``sent_at`` are still to be emailed."""
+    BACK_IN_STOCK = 'BACK_IN_STOCK'
+    PRICE_DROP = 'PRICE_DROP'
+    KIND_CHOICES = [
+        (BACK_IN_STOCK, 'Back in stock'),
+        (PRICE_DROP, 'Price drop'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    old_price = models.DecimalField(max_digits=10, decimal_places=2)
+    new_price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Only the undelivered tail is ever scanned by the sender
+            models.Index(fields=['id'], condition=models.Q(sent_at__isnull=True), name='wishlist_notify_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.product_id} for {self.user_id}"
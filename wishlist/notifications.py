@@ -0,0 +1,138 @@
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from orders.ingest import _batches
+from store.models import Product
+from .models import ProductSnapshot, Wishlist, WishlistNotification
+
+NOTIFY_BATCH_SIZE = 500
+SEND_BATCH_SIZE = 200
+
+
+def _changed_products(after, batch_size):
+    # Unchanged products are skipped by the WHERE clause, so a run over a
+    # quiet catalogue is a single pass over the product and snapshot tables
+    return list(
+        Product.objects.filter(id__gt=after)
+        .annotate(old_price=F('wishlist_snapshot__price'), old_stock=F('wishlist_snapshot__stock'))
+        .filter(Q(old_price__isnull=True) | ~Q(old_price=F('price')) | ~Q(old_stock=F('stock')))
+        .order_by('id')
+        .values_list('id', 'price', 'stock', 'is_available', 'old_price', 'old_stock')[:batch_size]
+    )
+
+
+def _alert(price, stock, is_available, old_price, old_stock):
+    if old_price is None or not is_available or stock == 0:
+        # First sighting, or nothing anyone could buy right now
+        return None
+    if old_stock == 0:
+        return WishlistNotification.BACK_IN_STOCK
+    if price < old_price:
+        return WishlistNotification.PRICE_DROP
+    return None
+
+
+def enqueue_notifications(batch_size=NOTIFY_BATCH_SIZE):
+    """Diff products against their snapshots and queue alerts for whoever wishlisted them.
+
+    Changed products are read in keyset batches of ``batch_size``, not
+    through one ``iterator()`` cursor: SQLite gives an open cursor no
+    isolation from the snapshot writes made on the same connection. For each
+    batch the outbox is filled by one INSERT ... SELECT joining the wishlist
+    on its product index, and the snapshots are moved forward in the same
+    transaction, so a crash never loses or repeats a batch. Memory is bounded
+    by the batch, not by the number of wishlist rows. Products seen for the
+    first time are only snapshotted. Returns the number of queued alerts.
+    """
+    queued = 0
+    after = 0
+    while True:
+        changed = _changed_products(after, batch_size)
+        if not changed:
+            return queued
+        after = changed[-1][0]
+
+        alerts = []
+        for product_id, price, stock, is_available, old_price, old_stock in changed:
+            kind = _alert(price, stock, is_available, old_price, old_stock)
+            if kind:
+                alerts.append((product_id, kind, old_price, price))
+
+        with transaction.atomic():
+            queued += insert_alerts(alerts)
+            ProductSnapshot.objects.bulk_create(
+                [ProductSnapshot(product_id=row[0], price=row[1], stock=row[2]) for row in changed],
+                update_conflicts=True,
+                unique_fields=['product'],
+                update_fields=['price', 'stock'],
+            )
+
+
+def insert_alerts(alerts):
+    """Queue one notification per wishlist row of each ``(product_id, kind, old_price, new_price)``."""
+    table = WishlistNotification._meta.db_table
+    adapt = connection.ops.adapt_decimalfield_value
+    created_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    queued = 0
+    with connection.cursor() as cursor:
+        # Four parameters per alert plus the shared timestamp; counting five
+        # per row leaves room for it in every batch
+        for batch in _batches(alerts, 5):
+            rows = ', '.join(['(%s, %s, %s, %s)'] * len(batch))
+            params = []
+            for product_id, kind, old_price, new_price in batch:
+                params += [product_id, kind, adapt(old_price), adapt(new_price)]
+            params.append(created_at)
+            cursor.execute(
+                # WITH inside the INSERT, not before it: sqlite3 only reports a
+                # rowcount for statements that start with the DML keyword
+                f"INSERT INTO {table} (user_id, product_id, kind, old_price, new_price, created_at) "
+                f"WITH v (product_id, kind, old_price, new_price) AS (VALUES {rows}) "
+                f"SELECT w.user_id, v.product_id, v.kind, v.old_price, v.new_price, %s "
+                f"FROM {Wishlist._meta.db_table} w JOIN v ON w.product_id = v.product_id",
+                params,
+            )
+            queued += cursor.rowcount
+    return queued
+
+
+def _message(notification):
+    product = notification.product
+    if notification.kind == WishlistNotification.BACK_IN_STOCK:
+        subject = f"Back in stock: {product.name}"
+        body = f"{product.name} from your wishlist is back in stock at ₹{notification.new_price}."
+    else:
+        subject = f"Price drop: {product.name}"
+        body = (
+            f"{product.name} from your wishlist dropped from ₹{notification.old_price} "
+            f"to ₹{notification.new_price}."
+        )
+    return EmailMessage(subject, body, to=[notification.user.email])
+
+
+def send_notifications(batch_size=SEND_BATCH_SIZE):
+    """Email queued notifications through the configured mail backend; returns how many were sent.
+
+    Rows are only marked sent after their batch went out, so a failing
+    backend leaves them queued for the next run (at-least-once delivery).
+    Users without an email address are marked sent without a message.
+    """
+    sent = 0
+    after = 0
+    with get_connection() as mail:
+        while True:
+            batch = list(
+                WishlistNotification.objects.filter(sent_at__isnull=True, id__gt=after)
+                .select_related('user', 'product')
+                .order_by('id')[:batch_size]
+            )
+            if not batch:
+                return sent
+            after = batch[-1].id
+            messages = [_message(n) for n in batch if n.user.email]
+            if messages:
+                mail.send_messages(messages)
+            WishlistNotification.objects.filter(id__in=[n.id for n in batch]).update(sent_at=timezone.now())
+            sent += len(messages)
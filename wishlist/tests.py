@@ -1,3 +1,166 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from store.models import Category, Product, ProductImage
+from .models import Wishlist, WishlistNotification
+from .notifications import enqueue_notifications, insert_alerts, send_notifications
+from .views import WISHLIST_PER_PAGE
+
+
+class WishlistToggleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Books", slug="books")
+        cls.products = [
+            Product.objects.create(category=category, name=f"Book {i}", slug=f"book-{i}", price=100)
+            for i in range(2)
+        ]
+        cls.user = User.objects.create_user("shopper", password="pass12345")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_toggle_is_one_statement_to_remove_and_two_to_add(self):
+        product = self.products[0]
+        with self.assertNumQueries(2):
+            self.assertTrue(Wishlist.objects.toggle(self.user.id, product.id))
+        with self.assertNumQueries(1):
+            self.assertFalse(Wishlist.objects.toggle(self.user.id, product.id))
+        self.assertFalse(Wishlist.objects.exists())
+
+    def test_add_skips_duplicates_and_missing_products(self):
+        self.assertEqual(Wishlist.objects.add(self.user.id, self.products[0].id), 1)
+        self.assertEqual(Wishlist.objects.add(self.user.id, self.products[0].id), 0)
+        self.assertIsNone(Wishlist.objects.toggle(self.user.id, 9999))
+        self.assertEqual(Wishlist.objects.count(), 1)
+
+    def test_json_api(self):
+        url = reverse("toggle_wishlist_api", args=[self.products[0].id])
+        self.assertEqual(self.client.post(url).json(), {"product_id": self.products[0].id, "in_wishlist": True})
+        self.assertEqual(self.client.post(url).json()["in_wishlist"], False)
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(reverse("toggle_wishlist_api", args=[9999])).status_code, 404)
+
+        self.client.logout()
+        self.assertEqual(self.client.post(url).status_code, 401)
+
+    def test_home_uses_cached_ids_until_toggle(self):
+        Wishlist.objects.create(user=self.user, product=self.products[0])
+        self.assertEqual(self.client.get(reverse("home")).context["wishlist_ids"], {self.products[0].id})
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("home"))
+        self.assertFalse([q for q in ctx.captured_queries if "wishlist_wishlist" in q["sql"]])
+
+        self.client.post(reverse("toggle_wishlist_api", args=[self.products[1].id]))
+        self.assertEqual(
+            self.client.get(reverse("home")).context["wishlist_ids"], {p.id for p in self.products}
+        )
+
+
+class MyWishlistTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Books", slug="books")
+        cls.user = User.objects.create_user("shopper", password="pass12345")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def save_products(self, count, start=0):
+        for i in range(start, start + count):
+            product = Product.objects.create(category=self.category, name=f"Book {i}", slug=f"book-{i}", price=100)
+            ProductImage.objects.create(product=product, image=f"product_images/{i}.jpg")
+            Wishlist.objects.create(user=self.user, product=product)
+
+    def count(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("my_wishlist"))
+        return len(ctx.captured_queries), response
+
+    def test_paginated_newest_first_in_constant_queries(self):
+        self.save_products(1)
+        small, _response = self.count()
+        self.save_products(WISHLIST_PER_PAGE + 5, start=1)
+        queries, response = self.count()
+        self.assertEqual(queries, small)
+
+        page = response.context["items"]
+        self.assertEqual(len(page), WISHLIST_PER_PAGE)
+        self.assertEqual(page.object_list[0].product.name, f"Book {WISHLIST_PER_PAGE + 5}")
+        self.assertContains(response, f"product_images/{WISHLIST_PER_PAGE + 5}.jpg")
+
+        response = self.client.get(reverse("my_wishlist"), {"cursor": page.next_cursor})
+        self.assertEqual(len(response.context["items"]), 6)
+
+
+class WishlistNotificationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Books", slug="books")
+        cls.sold_out = Product.objects.create(category=category, name="Sold out", slug="sold-out", price=100, stock=0)
+        cls.pricey = Product.objects.create(category=category, name="Pricey", slug="pricey", price=100, stock=5)
+        cls.quiet = Product.objects.create(category=category, name="Quiet", slug="quiet", price=100, stock=5)
+        cls.alice = User.objects.create_user("alice", email="alice@example.com", password="pass12345")
+        cls.bob = User.objects.create_user("bob", password="pass12345")
+        for user in (cls.alice, cls.bob):
+            for product in (cls.sold_out, cls.pricey, cls.quiet):
+                Wishlist.objects.create(user=user, product=product)
+
+    def test_first_run_only_takes_snapshots(self):
+        self.assertEqual(enqueue_notifications(), 0)
+        self.assertFalse(WishlistNotification.objects.exists())
+
+    def test_restock_and_price_drop_queue_one_alert_per_wishlister(self):
+        enqueue_notifications()
+        Product.objects.filter(id=self.sold_out.id).update(stock=3)
+        Product.objects.filter(id=self.pricey.id).update(price=80)
+        Product.objects.filter(id=self.quiet.id).update(price=120, stock=4)
+
+        self.assertEqual(enqueue_notifications(batch_size=1), 4)
+        alerts = set(WishlistNotification.objects.values_list("user_id", "product_id", "kind", "old_price", "new_price"))
+        self.assertEqual(alerts, {
+            (user.id, self.sold_out.id, WishlistNotification.BACK_IN_STOCK, Decimal("100"), Decimal("100"))
+            for user in (self.alice, self.bob)
+        } | {
+            (user.id, self.pricey.id, WishlistNotification.PRICE_DROP, Decimal("100"), Decimal("80"))
+            for user in (self.alice, self.bob)
+        })
+        # Snapshots moved forward, so nothing is queued twice
+        self.assertEqual(enqueue_notifications(), 0)
+
+    def test_alert_insert_is_split_to_fit_the_parameter_limit(self):
+        alerts = [
+            (product.id, WishlistNotification.PRICE_DROP, Decimal("100"), Decimal("80"))
+            for product in (self.sold_out, self.pricey, self.quiet)
+        ]
+        with mock.patch.object(connection.features, "max_query_params", 10):
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(insert_alerts(alerts), 6)
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(WishlistNotification.objects.count(), 6)
+
+    def test_send_emails_users_with_an_address_and_drains_the_outbox(self):
+        enqueue_notifications()
+        Product.objects.filter(id=self.pricey.id).update(price=80)
+        enqueue_notifications()
 
-# Create your tests here.
+        self.assertEqual(send_notifications(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["alice@example.com"])
+        self.assertIn("Price drop: Pricey", mail.outbox[0].subject)
+        self.assertFalse(WishlistNotification.objects.filter(sent_at__isnull=True).exists())
+        self.assertEqual(send_notifications(), 0)
@@ -6,6 +6,7 @@ urlpatterns = [
     path('add/<int:product_id>/', views.add_to_wishlist, name='add_to_wishlist'),
     path('remove/<int:item_id>/', views.remove_from_wishlist, name='remove_from_wishlist'),
     path('toggle/<int:product_id>/', views.toggle_wishlist, name='toggle_wishlist'),
+    path('api/toggle/<int:product_id>/', views.toggle_wishlist_api, name='toggle_wishlist_api'),
 
     
 ]
@@ -1,34 +1,55 @@
 from django.shortcuts import redirect, render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from store.models import Product
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_POST
+from store.models import Product, featured_image_prefetch
+from store.pagination import KeysetPaginator
+from .caching import invalidate_wishlist_ids
 from .models import Wishlist
 
+WISHLIST_PER_PAGE = 24
+
 @login_required
 def add_to_wishlist(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
-    Wishlist.objects.get_or_create(user=request.user, product=product)
+    if not Wishlist.objects.add(request.user.id, product_id):
+        get_object_or_404(Product.objects.only('id'), id=product_id)
+    invalidate_wishlist_ids(request.user.id)
     return redirect(request.META.get('HTTP_REFERER', 'store'))
 
 @login_required
 def remove_from_wishlist(request, item_id):
     item = get_object_or_404(Wishlist, id=item_id, user=request.user)
     item.delete()
+    invalidate_wishlist_ids(request.user.id)
     return redirect('my_wishlist')
 
 @login_required
 def my_wishlist(request):
-    items = Wishlist.objects.filter(user=request.user)
-    return render(request, 'wishlist/my_wishlist.html', {'items': items})
+    items = Wishlist.objects.filter(user=request.user).select_related(
+        'product__brand', 'product__category'
+    ).prefetch_related(featured_image_prefetch('product__images'))
+    page = KeysetPaginator(items, ('-added_at', '-id'), per_page=WISHLIST_PER_PAGE).get_page(
+        request.GET.get('cursor')
+    )
+    return render(request, 'wishlist/my_wishlist.html', {'items': page})
 
 
 @login_required
 def toggle_wishlist(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
-    item = Wishlist.objects.filter(user=request.user, product=product)
-
-    if item.exists():
-        item.delete()  # remove
-    else:
-        Wishlist.objects.create(user=request.user, product=product)  # add
+    if Wishlist.objects.toggle(request.user.id, product_id) is None:
+        raise Http404("No Product matches the given query.")
+    invalidate_wishlist_ids(request.user.id)
 
     return redirect(request.META.get('HTTP_REFERER', 'store'))
+
+
+# AJAX toggle: JSON instead of a redirect and full page render
+@require_POST
+def toggle_wishlist_api(request, product_id):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Log in to use your wishlist.'}, status=401)
+    in_wishlist = Wishlist.objects.toggle(request.user.id, product_id)
+    if in_wishlist is None:
+        return JsonResponse({'error': 'No such product.'}, status=404)
+    invalidate_wishlist_ids(request.user.id)
+    return JsonResponse({'product_id': product_id, 'in_wishlist': in_wishlist})